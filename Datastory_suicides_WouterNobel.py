@@ -1,7 +1,17 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import json
+
+from data_loader import data_version, WORLD_CSV, WHO_CSV, PROVINCES_GEOJSON
+from cbs_ingest import load_cbs_tables, cbs_version
+from aggregates import (load_cube, load_world_years, load_who_years, country_totals, country_totals_by_year,
+                        country_sex_totals, load_window_change, who_rates, who_trend)
+from dimensions import load_dimensions, filter_rows
+from country_keys import load_country_keys, with_iso3
+from figure_cache import get_figure_cache, age_key
+from geo_assets import load_provinces
+from image_assets import load_image
+import instrumentation as profiler
+from instrumentation import logger
+import charts
 
 
 # Page configuration
@@ -22,7 +32,7 @@ body {
 #------------------------------------------------------------------------------------------------------------------
 #sidebar creatian
 # Sidebar filters
-st.sidebar.image("Pictures/Portret.jpg")
+st.sidebar.image(load_image("Portret.jpg")) # resized variants, kept in memory for all sessions
 
 # Add a text block with a background
 st.sidebar.markdown(
@@ -46,7 +56,7 @@ st.sidebar.markdown(
 col1, col2, col3 = st.columns([1, 3, 1])  # Adjust the middle column width as needed
 
 with col2:  # Everything inside col2 will be centered
-    st.image("Pictures/header.png")
+    st.image(load_image("header.png"))
     st.markdown("## Suicide worldwide: Unveiling the Impact of Gender, Economy, and Society")
    
     st.write('''Suicide is a major public health concern that affects individuals, families, and entire communities.
@@ -56,391 +66,420 @@ with col2:  # Everything inside col2 will be centered
              It even was the third leading cause of death among 15–29-year-olds globally in 2021 (World Health Organization, 2024).
                 ''')
                 
-    #------------------------------------------------------------------------------------------------------------------          
-    st.markdown("""___""") # make a stripe to seperate the graphs                
-    st.markdown("### 1. Worlwide data over the years")
-    st.write('''When looking at the data, one key question arises: Is the situation improving or worsening? 
-             The answer, based on the numbers, suicide rates have generally declined over time.
-             Comparing the decade from 2006 to 2015 with the previous period (1996-2005), many countries show a notable decrease in suicides.
-             This trend is visible across different age groups and both genders, suggesting a broader societal shift 
-             rather than a temporary fluctuation. Though there are still some countries that show an increase.''')
-                
-    df = pd.read_csv("Data/Suicide_rates.csv") #load the dataset
-    print(df.head(13))
-    print(df.dtypes)
-    
-    #filters
+    # Data shared by all sections (cached, only re-read when a file changes)
+    profiler.start_section("shared")
+    with profiler.stage("shared", "load world data") as info:
+        world_years = load_world_years() #the world dataset, partitioned by year
+        dims = load_dimensions() #integer codes of every country, sex, age group and generation
+        cube = load_cube() #suicides and population per year, country, sex and age (shared by all sessions)
+        iso3, _ = load_country_keys() #ISO-3 code of every country, resolved once with the WHO codes
+        info["rows"] = len(world_years.df)
+    world_version = data_version(WORLD_CSV) #part of every figure key, so changed data is never served from the cache
+    who_version = data_version(WHO_CSV) #the ISO-3 codes of the map come from the WHO file
+    figures = get_figure_cache() #finished figures, shared by all sessions
+    logger.debug("world data:\n%s", world_years.df.head(13))
+    logger.debug("world data types:\n%s", world_years.df.dtypes)
+    
+    # Every section below is a fragment: a widget only reruns the section it belongs to,
+    # not the whole page. Sections do not share widget values.
     
-    # Create two columns
-    col1, col2 = st.columns(2)
-    
-    # Place Gender Selector in the first column
-    with col1:
-        gender_selector = st.radio(
-            "Select Sex",
-            ("Both", "male", "female")
+    #------------------------------------------------------------------------------------------------------------------          
+    @st.fragment
+    def world_section():
+        profiler.start_section("world")
+        st.markdown("""___""") # make a stripe to seperate the graphs                
+        st.markdown("### 1. Worlwide data over the years")
+        st.write('''When looking at the data, one key question arises: Is the situation improving or worsening? 
+                 The answer, based on the numbers, suicide rates have generally declined over time.
+                 Comparing the decade from 2006 to 2015 with the previous period (1996-2005), many countries show a notable decrease in suicides.
+                 This trend is visible across different age groups and both genders, suggesting a broader societal shift 
+                 rather than a temporary fluctuation. Though there are still some countries that show an increase.''')
+                    
+        #filters
+        
+        # Create two columns
+        col1, col2 = st.columns(2)
+        
+        # Place Gender Selector in the first column
+        with col1:
+            gender_selector = st.radio(
+                "Select Sex",
+                ("Both", "male", "female")
+            )
+        
+        # Place Measure Selector in the second column
+        with col2:
+            measure_selector = st.radio(
+                "Select Measure",
+                ("Suicides per 100k", "Total Suicides")
+            )
+        
+        age_options = ["All"] + dims["age"].labels
+        
+        # Age Group Selector 
+        age_selector = st.multiselect(
+            "Select Age Groups",
+            options=age_options,  # Use the age groups of the dataset, youngest first
+            default=["All"]    # Default to all age groups selected
         )
-    
-    # Place Measure Selector in the second column
-    with col2:
-        measure_selector = st.radio(
-            "Select Measure",
-            ("Suicides per 100k", "Total Suicides")
+        
+        
+        
+        # Play all years in the browser instead of moving the slider
+        animate_map = st.checkbox("Animate over years")
+        
+        # Year Slider to choose the year
+        selected_year_map = st.slider(
+            "Select Year for map", 
+            min_value=world_years.min_year, 
+            max_value=world_years.max_year, 
+            value=2000, 
+            step=1
         )
-    
-    age_options = ["All"] + df["age"].unique().tolist()
-    
-    # Age Group Selector 
-    age_selector = st.multiselect(
-        "Select Age Groups",
-        options=age_options,  # Use the unique age groups from the dataset
-        default=["All"]    # Default to all age groups selected
-    )
-    
-    
-    
-    # Year Slider to choose the year
-    selected_year_map = st.slider(
-        "Select Year for map", 
-        min_value=df["year"].min(), 
-        max_value=df["year"].max(), 
-        value=2000, 
-        step=1
-    )
-    
-    # Filter dataset based on the selected year
-    filtered_data = df[df["year"] == selected_year_map]
-    
-    # Filter based on gender selection
-    if gender_selector != "Both":
-        filtered_data = filtered_data[filtered_data["sex"] == gender_selector]
-    
-    if "All" in age_selector:
-        filtered_data = filtered_data
-    else:    
-        # Filter based on age group selection
-        filtered_data = filtered_data[filtered_data["age"].isin(age_selector)]
-    
-    # Choose the column to display based on the measure selector
-    if measure_selector == "Total Suicides":
-        color_column = "suicides_no"
-        color_title = "Total Suicides"
-        # Aggregate suicides per country
-        map_data = filtered_data.groupby("country", as_index=False)["suicides_no"].sum()
-    else:
-        color_column = "suicides_per_100k"
-        color_title = "Suicides per 100k"
-        # Aggregate suicides per country
-        # Aggregating suicide numbers and population by country
-        agg_suic_data = filtered_data.groupby("country", as_index=False)["suicides_no"].sum()
-        agg_pop_data = filtered_data.groupby("country", as_index=False)["population"].sum()
-    
-        # Merging the aggregated data on country
-        map_data = pd.merge(agg_suic_data, agg_pop_data, on="country")
-    
-        # Calculating the suicides per 100,000 people
-        map_data["suicides_per_100k"] = (map_data["suicides_no"] / map_data["population"]) * 100000
         
-    # Checkbox to show raw data
-    if st.checkbox("Show raw data"):
-        st.subheader("Raw Data")
-        st.dataframe(filtered_data)
-    
-    
+        # None means no filter
+        selected_sex = None if gender_selector == "Both" else gender_selector
+        selected_ages = None if "All" in age_selector else age_selector
+        
+        # Choose the column to display based on the measure selector
+        if measure_selector == "Total Suicides":
+            color_column = "suicides_no"
+            color_title = "Total Suicides"
+        else:
+            color_column = "suicides_per_100k"
+            color_title = "Suicides per 100k"
+            
+        # Checkbox to show raw data
+        if st.checkbox("Show raw data"):
+            # Rows of the selected year (a slice, no scan over the year column), filtered on the codes of sex and age
+            filtered_data = filter_rows(dims, world_years[selected_year_map],
+                                        {"sex": None if selected_sex is None else [selected_sex], "age": selected_ages})
+            st.subheader("Raw Data")
+            st.dataframe(filtered_data)
+        
+        
+        
+        def build_map():
+            # Aggregate suicides and population per country from a slice of the cube
+            with profiler.stage("world", "aggregate") as info:
+                map_data = with_iso3(country_totals(cube, dims, selected_year_map, selected_sex, selected_ages), iso3)
+                info["rows"] = len(map_data)
+            with profiler.stage("world", "plotly"):
+                return charts.world_map(map_data, color_column, color_title, selected_year_map)
+        
+        def build_animated_map():
+            # All years in one pass over the cube, the frames only differ in the year column
+            with profiler.stage("world", "aggregate") as info:
+                map_data = with_iso3(country_totals_by_year(cube, dims, selected_sex, selected_ages), iso3)
+                info["rows"] = len(map_data)
+            with profiler.stage("world", "plotly"):
+                return charts.world_map_animated(map_data, color_column, color_title)
+        
+        # Create Choropleth Map, only when this filter state is not in the figure cache yet
+        if animate_map:
+            # the year slider is not part of the key, every year is in the figure
+            fig = profiler.cached_figure(
+                "world", figures,
+                ("world_map_animated", world_version, who_version, selected_sex, measure_selector, age_key(selected_ages)),
+                build_animated_map
+            )
+        else:
+            fig = profiler.cached_figure(
+                "world", figures,
+                ("world_map", world_version, who_version, selected_year_map, selected_sex, measure_selector, age_key(selected_ages)),
+                build_map
+            )
+        
+        # Display map
+        profiler.plotly_chart("world", fig)
+        
+        st.markdown("""___""") # make a stripe to seperate the graphs
     
-    # Create Choropleth Map
-    fig = px.choropleth(
-        map_data,
-        locations="country",  # Country names
-        locationmode="country names",  # Matches country names
-        color=color_column,  # Use the selected measure for color intensity
-        hover_name="country",  # Display country name on hover
-        color_continuous_scale="Portland",  # Adjust color scale
-        title=f"{color_title} in {selected_year_map}, (WHO, 2016)"  # Title reflecting the selected year and measure
-    )
+    world_section()
     
-    # Customize the layout
-    fig.update_layout(
-    template='simple_white',
-    plot_bgcolor='rgba(0, 0, 0, 0)',
-    paper_bgcolor='rgba(0, 0, 0, 0)',
-    margin=dict(l=0, r=0, t=50, b=0),
-    height=400,
-    geo=dict(
-        bgcolor='#D2D2D2'
-    ),
-    coloraxis_colorbar=dict(
-        title=dict(
-            text=color_title,
-            side="right",
-            font=dict(size=14)
+    #------------------------------------------------------------------------------------------------------------------
+    #Comparing two periods, checks the claim of section 1
+    @st.fragment
+    def decade_section():
+        profiler.start_section("decades")
+        st.markdown("#### Did it really get better? Comparing two periods")
+        st.write("""Below the suicide rate of every country in two periods is compared. A country is only shown when it has data in both periods.
+                 Green bars are countries where the rate went down, red bars countries where it went up.""")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            window_before = st.slider("First period", min_value=world_years.min_year, max_value=world_years.max_year,
+                                      value=(1996, 2005), step=1)
+        with col2:
+            window_after = st.slider("Second period", min_value=world_years.min_year, max_value=world_years.max_year,
+                                     value=(2006, 2015), step=1)
+        
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            compare_sex = st.radio("Select Sex for the comparison", ("Both", "male", "female"))
+        with col2:
+            compare_ages = st.multiselect("Select Age Groups for the comparison", options=["All"] + dims["age"].labels,
+                                          default=["All"])
+        with col3:
+            compare_view = st.radio("Show as", ("Bar chart", "Map"))
+        
+        selected_sex = None if compare_sex == "Both" else compare_sex
+        selected_ages = None if "All" in compare_ages else compare_ages
+        
+        # the sums per period are computed once per pair of periods, sex and age only select from them
+        with profiler.stage("decades", "aggregate") as info:
+            change = load_window_change(window_before, window_after, selected_sex, selected_ages)
+            info["rows"] = len(change)
+        
+        if change.empty:
+            st.write("No country has data in both periods for this selection.")
+        else:
+            decreased = int((change["change"] < 0).sum())
+            st.write(f"In **{decreased} of the {len(change)}** countries the suicide rate was lower in "
+                     f"{window_after[0]}-{window_after[1]} than in {window_before[0]}-{window_before[1]}.")
+            
+            def build_change():
+                with profiler.stage("decades", "plotly"):
+                    if compare_view == "Map":
+                        return charts.change_map(with_iso3(change, iso3), window_before, window_after)
+                    return charts.change_bars(change, window_before, window_after)
+            
+            fig_change = profiler.cached_figure(
+                "decades", figures,
+                ("change", world_version, who_version, window_before, window_after, selected_sex,
+                 age_key(selected_ages), compare_view),
+                build_change
             )
-        )
-    )
-    
-    # Display map
-    st.plotly_chart(fig)
+            profiler.plotly_chart("decades", fig_change)
+        
+        st.markdown("""___""") # make a stripe to seperate the graphs
     
-    st.markdown("""___""") # make a stripe to seperate the graphs
+    decade_section()
     
     #------------------------------------------------------------------------------------------------------------------
     #Sex view
-    st.markdown("### 2. Difference between sexes")
-    
-    st.write("""Globally, there are significant disparities in suicide rates between men and women.
-             While females are more likely to experience suicidal thoughts and attempt suicide, 
-             males are more likely to die by suicide a phenomenon often referred to as the "gender paradox" in suicidal behavior. 
-             This discrepancy is attributed to several factors, including the tendency of males to choose more lethal means
-             and societal norms that discourage men from seeking help for mental health issues (Schrijvers et al., 2011).""")
-    
-     # Year Slider to choose the year
-    selected_year_box = st.slider(
-        "Select Year for box plot", 
-        min_value=df["year"].min(), 
-        max_value=df["year"].max(), 
-        value=2000, 
-        step=1
-    )
-    # Filter dataset based on the selected year
-    filtered_data_box = df[df["year"] == selected_year_box]
-    
-    age_options = ["All"] + df["age"].unique().tolist()
-    # Age Group Selector 
-    age_selector_box = st.multiselect(
-        "Select Age Groups for box plot",
-        options=age_options,  # Use the unique age groups from the dataset
-        default=["All"]    # Default to all age groups selected
-    )
-    
-    if "All" in age_selector_box:
-        filtered_data_box = filtered_data_box
-    else:    
-        # Filter based on age group selection
-        filtered_data_box = filtered_data_box[filtered_data_box["age"].isin(age_selector_box)]
-    
-    
-    # Aggregate suicides per country and sex
-    agg_suic_data_box = filtered_data_box.groupby(["country", "sex","gdp_per_capita ($)"], as_index=False)["suicides_no"].sum()
-    agg_pop_data_box = filtered_data_box.groupby(["country", "sex","gdp_per_capita ($)"], as_index=False)["population"].sum()
-    
-    # Merging the aggregated data on country and sex
-    box_data = pd.merge(agg_suic_data_box, agg_pop_data_box, on=["country", "sex","gdp_per_capita ($)"])
-    
-    # Calculating the suicides per 100,000 people
-    box_data["suicides_per_100k"] = (box_data["suicides_no"] / box_data["population"]) * 100000
-    
-    # Create Box Plot
-    fig_box = px.box(
-        box_data,
-        x="sex",
-        y="suicides_per_100k",
-        color="sex",
-        category_orders={"sex": ["female", "male"]},  # Ensure order remains consistent
-        color_discrete_map={
-            "male": "rgb(0,150,255)",   # Male = Blue
-            "female": "rgb(255,16,240)" # Female = Pink
-        },
-        points="all",  # Show all individual points
-        title=f"Sum worldwide {color_title} in {selected_year_box} comparing sex, (WHO, 2016)",
-        labels={color_column: color_title, "sex": "Sex"},
-        hover_data=["country"]  # Show country on hover
-    )
-    
-    
-    # Customize Layout
-    fig_box.update_layout(
-        template='simple_white',
-        plot_bgcolor='rgba(0, 0, 0, 0)',
-        paper_bgcolor='rgba(0, 0, 0, 0)',
-        margin=dict(l=0, r=0, t=50, b=0),  # margins so title shows
-        height=400
-    )
+    @st.fragment
+    def sex_section():
+        profiler.start_section("sex")
+        st.markdown("### 2. Difference between sexes")
+        
+        st.write("""Globally, there are significant disparities in suicide rates between men and women.
+                 While females are more likely to experience suicidal thoughts and attempt suicide, 
+                 males are more likely to die by suicide a phenomenon often referred to as the "gender paradox" in suicidal behavior. 
+                 This discrepancy is attributed to several factors, including the tendency of males to choose more lethal means
+                 and societal norms that discourage men from seeking help for mental health issues (Schrijvers et al., 2011).""")
+        
+         # Year Slider to choose the year
+        selected_year_box = st.slider(
+            "Select Year for box plot", 
+            min_value=world_years.min_year, 
+            max_value=world_years.max_year, 
+            value=2000, 
+            step=1
+        )
+        age_options = ["All"] + dims["age"].labels
+        # Age Group Selector 
+        age_selector_box = st.multiselect(
+            "Select Age Groups for box plot",
+            options=age_options,  # Use the age groups of the dataset, youngest first
+            default=["All"]    # Default to all age groups selected
+        )
+        
+        selected_ages_box = None if "All" in age_selector_box else age_selector_box
+        
+        def build_box():
+            # Aggregate suicides per 100,000 people per country and sex
+            with profiler.stage("sex", "aggregate") as info:
+                box_data = country_sex_totals(cube, dims, selected_year_box, selected_ages_box)
+                info["rows"] = len(box_data)
+            with profiler.stage("sex", "plotly"):
+                return charts.sex_box(box_data, selected_year_box)
+        
+        # Create Box Plot (cached per filter state)
+        fig_box = profiler.cached_figure(
+            "sex", figures, ("sex_box", world_version, selected_year_box, age_key(selected_ages_box)), build_box
+        )
+        
+        # Show Box Plot
+        profiler.plotly_chart("sex", fig_box)
+        
+        st.markdown("""___""") # make a stripe to seperate the graphs
     
-    # Show Box Plot
-    st.plotly_chart(fig_box)
+    sex_section()
     
-    st.markdown("""___""") # make a stripe to seperate the graphs
     #------------------------------------------------------------------------------------------------------------------
     #comparing the GDP
+    @st.fragment
+    def gdp_section():
+        profiler.start_section("gdp")
+        
+        st.image(load_image("geldzorgen.png")) # picture about money isues
+        
+        st.markdown("### 3. Can Economic Growth Help Prevent Suicides?")
+        
+        st.write("""Suicide is a complex issue influenced by various social, psychological, and economic factors. 
+                 While wealthier nations generally have lower suicide rates, research suggests that economic growth alone does not guarantee protection
+                 against suicide. However, a global analysis found that for every 1,000 dollar increase in GDP per capita, 
+                 suicide rates decrease by 2%. This effect is particularly strong in low-income countries, where a small 
+                 economic boost can lead to a nearly 29% reduction in suicide rates.
+                 Interestingly, investing in suicide prevention 
+                 could be cost-effective. The study estimates that providing 1,000 dollar to 500 high-risk individuals could save at least one life,
+                 which is far less expensive than the estimated economic cost of a single suicide over 500,000 dollar. This suggests that governments 
+                 should not only focus on economic growth but also on direct social support to those most vulnerable during financial hardship (Meda et al., 2021). """)
+                 
+        # Year Slider to choose the year for the scatter plot
+        selected_year_scatter = st.slider(
+            "Select Year for scatter plot", 
+            min_value=world_years.min_year, 
+            max_value=world_years.max_year, 
+            value=2000, 
+            step=1
+        )
+        
+        def build_scatter():
+            # Same aggregation per country and sex as the box plot, but for all age groups
+            with profiler.stage("gdp", "aggregate") as info:
+                scatter_data = country_sex_totals(cube, dims, selected_year_scatter)
+                info["rows"] = len(scatter_data)
+            with profiler.stage("gdp", "plotly"):
+                return charts.gdp_scatter(scatter_data)
+        
+        # Create Scatter Plot (cached per year)
+        fig_scatter = profiler.cached_figure(
+            "gdp", figures, ("gdp_scatter", world_version, selected_year_scatter), build_scatter
+        )
+        
+        # Show Scatter Plot
+        profiler.plotly_chart("gdp", fig_scatter)
+        
+        st.markdown("""___""") # make a stripe to seperate the graphs
     
-    st.image("Pictures/geldzorgen.png") # picture about money isues
-    
-    st.markdown("### 3. Can Economic Growth Help Prevent Suicides?")
-    
-    st.write("""Suicide is a complex issue influenced by various social, psychological, and economic factors. 
-             While wealthier nations generally have lower suicide rates, research suggests that economic growth alone does not guarantee protection
-             against suicide. However, a global analysis found that for every 1,000 dollar increase in GDP per capita, 
-             suicide rates decrease by 2%. This effect is particularly strong in low-income countries, where a small 
-             economic boost can lead to a nearly 29% reduction in suicide rates.
-             Interestingly, investing in suicide prevention 
-             could be cost-effective. The study estimates that providing 1,000 dollar to 500 high-risk individuals could save at least one life,
-             which is far less expensive than the estimated economic cost of a single suicide over 500,000 dollar. This suggests that governments 
-             should not only focus on economic growth but also on direct social support to those most vulnerable during financial hardship (Meda et al., 2021). """)
-             
-    # Year Slider to choose the year for the scatter plot
-    selected_year_scatter = st.slider(
-        "Select Year for scatter plot", 
-        min_value=df["year"].min(), 
-        max_value=df["year"].max(), 
-        value=2000, 
-        step=1
-    )
-    
-    # Filter dataset based on the selected year for the scatter plot
-    filtered_data_scatter = df[df["year"] == selected_year_scatter]
-    
-    # Aggregate suicides per country and sex for the scatter plot
-    agg_suic_data_scatter = filtered_data_scatter.groupby(["country", "sex", "gdp_per_capita ($)"], as_index=False)["suicides_no"].sum()
-    agg_pop_data_scatter = filtered_data_scatter.groupby(["country", "sex", "gdp_per_capita ($)"], as_index=False)["population"].sum()
-    
-    # Merging the aggregated data on country, sex, and GDP per capita for the scatter plot
-    scatter_data = pd.merge(agg_suic_data_scatter, agg_pop_data_scatter, on=["country", "sex", "gdp_per_capita ($)"])
-    
-    # Calculating the suicides per 100,000 people for the scatter plot
-    scatter_data["suicides_per_100k"] = (scatter_data["suicides_no"] / scatter_data["population"]) * 100000
-    
-    # Create Scatter Plot
-    fig_scatter = px.scatter(
-        scatter_data,
-        x="gdp_per_capita ($)",
-        y="suicides_per_100k",
-        color="sex",
-        category_orders={"Sex": ["female", "male"]},  # Ensure order remains consistent
-        
-        color_discrete_map={
-            "male": "rgb(0,150,255)",   # Male = Blue
-            "female": "rgb(255,16,240)" # Female = Pink
-        },
-        title="Suicides per 100,000 People vs GDP per Capita, (World Bank, 2018),(WHO, 2016)",
-        labels={"gdp_per_capita ($)": "GDP per Capita", "suicides_per_100k": "Suicides per 100,000 People"},
-        hover_data=["country", "sex"]
-    )
-    
-    # Show Scatter Plot
-    st.plotly_chart(fig_scatter)
+    gdp_section()
     
-    st.markdown("""___""") # make a stripe to seperate the graphs
     #------------------------------------------------------------------------------------------------------------------
+    @st.fragment
+    def nl_section():
+        profiler.start_section("nl")
+        # Both CBS tables come from the store (the workbook is only parsed when it is new) and are cached
+        with profiler.stage("nl", "load cbs tables") as info:
+            df_1, _ = load_cbs_tables()
+            info["rows"] = len(df_1)
+        logger.debug("cbs table 1:\n%s", df_1.head(8))
+        logger.debug("cbs table 1 types:\n%s", df_1.dtypes)
+        
+        st.markdown("### 4. Lets zoom in: data in the Netherlands")
+        
+        st.write("""Suicide rates in the Netherlands follow a similar pattern to global trends, 
+                 with men consistently having higher suicide rates than women. This is largely due to the fact that men often choose more lethal
+                 methods, such as hanging. Additionally, suicide is a leading cause of death among young adults, with 3 out of 10 deaths
+                 in the 20-30 age group being attributed to suicide closely mirroring worldwide statistics. 
+                 While the overall suicide rate in the Netherlands has remained relatively stable since 2019,
+                 these figures highlight the ongoing need for mental health awareness and intervention efforts (CBS, 2024).
+                 """)
+        #line charts is used to plot some variable:
+        fig_line_NL = profiler.cached_figure("nl", figures, ("nl_line", cbs_version()), lambda: charts.nl_line(df_1))
+        
+        # Show Scatter Plot
+        profiler.plotly_chart("nl", fig_line_NL)
+        
+        st.markdown("""___""") # make a stripe to seperate the graphs
     
-    df_1 = pd.read_excel("Data/Zelfdodingen_1970-2023_NL.xlsx",sheet_name= "Tabel 1", skiprows=4,skipfooter=3)
-
-    # Rename columns 
-    df_1.columns = ["Year", 
-              "Men_Absolute", "Women_Absolute", "Total_Absolute","",
-              "Men_Per100k", "Women_Per100k", "Total_Per100k","",
-              "Men_Standardized", "Women_Standardized", "Total_Standardized"]
-    print(df_1.dtypes)
-    
-    # Drop unnamed or empty columns
-    df_1 = df_1.loc[:, df_1.columns != ""]
-
-    # Now, convert the 'year' column to numeric (integer) values
-    df_1['Year'] = pd.to_numeric(df_1['Year'], errors='coerce')
-    print(df_1.head(8))
-    print(df_1.dtypes)
-    
-    st.markdown("### 4. Lets zoom in: data in the Netherlands")
-    
-    st.write("""Suicide rates in the Netherlands follow a similar pattern to global trends, 
-             with men consistently having higher suicide rates than women. This is largely due to the fact that men often choose more lethal
-             methods, such as hanging. Additionally, suicide is a leading cause of death among young adults, with 3 out of 10 deaths
-             in the 20-30 age group being attributed to suicide closely mirroring worldwide statistics. 
-             While the overall suicide rate in the Netherlands has remained relatively stable since 2019,
-             these figures highlight the ongoing need for mental health awareness and intervention efforts (CBS, 2024).
-             """)
-    #line charts is used to plot some variable:
-    fig_line_NL = px.line(data_frame=df_1,
-             x="Year",
-             y=["Men_Standardized","Women_Standardized", "Total_Standardized"],
-             title="""Suicide per 100K people in the Netherlands<br><sup>
-             standardized by age from 2023</sup>""",
-             labels={"value": "Suicides per 100K", "variable": "Sex"},
-             color_discrete_map={
-                 "Men_Standardized": "rgb(0,150,255)",   # Male = Blue
-                 "Women_Standardized": "rgb(255,16,240)", # Female = Pink
-                 "Total_Standardized": "rgb(17,217,87)"
-             })
-    
-    # Rename legend labels
-    fig_line_NL.for_each_trace(lambda t: t.update(name={
-    "Men_Standardized": "Men",
-    "Women_Standardized": "Women",
-    "Total_Standardized": "Total"
-    }.get(t.name, t.name)))
-    
-    # Show Scatter Plot
-    st.plotly_chart(fig_line_NL)
+    nl_section()
     
-    st.markdown("""___""") # make a stripe to seperate the graphs
     #------------------------------------------------------------------------------------------------------------------
-    df_2 = pd.read_excel("Data/Zelfdodingen_1970-2023_NL.xlsx",sheet_name= "Tabel 3", skiprows=8,skipfooter=7)
-    # Rename columns (assuming structure from your example)
-    df_2.columns = ["provincie", 
-              "2019", "2020","2021", "2022","2023",
-               "absoluut-19-23", "p100k-19-23"]
-    
-    df_2.dropna(inplace=True)
-    print(df_2.head(8))
-    print(df_2.dtypes)
-    
-    # Load GeoJSON file
-    with open("Data/provinces_nederland.geojson", "r", encoding="utf-8") as f:
-        provincies = json.load(f)
-    
-    st.markdown("### 5. Regional Suicide Trends in the Netherlands")
-    
-    st.write("""The map provides an overview of suicide rates per province in the Netherlands, Regional differences have remained relatively stable over time, 
-             though some provinces show exceptions. Utrecht, South Holland, and Flevoland have consistently lower suicide rates, 
-             while Groningen and Drenthe have had high rates since the late 1990s. This trend continued into 2023.
-             Urbanization also plays a key role in the distribution of suicide rates. In less urbanized areas such as Southwest
-             Drenthe and Zeeuws-Vlaanderen, suicide rates are significantly higher than the national average, 
-             whereas in highly urbanized regions like Greater Amsterdam and The Hague metropolitan area, 
-             the numbers align more closely with the national average. Research suggests that rural areas face stronger 
-             risk factors, including higher unemployment, social isolation, and substance abuse. Additionally, a greater stigma 
-             surrounding mental health issues often makes it harder to seek help, limiting access to mental health services and 
-             suicide prevention resources (CBS, 2021).
-             """)
+    @st.fragment
+    def province_section():
+        profiler.start_section("provinces")
+        with profiler.stage("provinces", "load cbs tables") as info:
+            _, df_2 = load_cbs_tables()
+            info["rows"] = len(df_2)
+        logger.debug("cbs table 3:\n%s", df_2.head(8))
+        logger.debug("cbs table 3 types:\n%s", df_2.dtypes)
+        
+        st.markdown("### 5. Regional Suicide Trends in the Netherlands")
+        
+        st.write("""The map provides an overview of suicide rates per province in the Netherlands, Regional differences have remained relatively stable over time, 
+                 though some provinces show exceptions. Utrecht, South Holland, and Flevoland have consistently lower suicide rates, 
+                 while Groningen and Drenthe have had high rates since the late 1990s. This trend continued into 2023.
+                 Urbanization also plays a key role in the distribution of suicide rates. In less urbanized areas such as Southwest
+                 Drenthe and Zeeuws-Vlaanderen, suicide rates are significantly higher than the national average, 
+                 whereas in highly urbanized regions like Greater Amsterdam and The Hague metropolitan area, 
+                 the numbers align more closely with the national average. Research suggests that rural areas face stronger 
+                 risk factors, including higher unemployment, social isolation, and substance abuse. Additionally, a greater stigma 
+                 surrounding mental health issues often makes it harder to seek help, limiting access to mental health services and 
+                 suicide prevention resources (CBS, 2021).
+                 """)
+        
+        # Simplified borders by default, they are ~6x smaller to send to the browser
+        detailed_borders = st.checkbox("Show detailed province borders")
+        
+        # Load GeoJSON file (cached) and create Choropleth Map, each geometry is only put in a figure once
+        map_nl = profiler.cached_figure(
+            "provinces", figures,
+            ("nl_map", cbs_version(), data_version(PROVINCES_GEOJSON), detailed_borders),
+            lambda: charts.nl_map(df_2, load_provinces(simplified=not detailed_borders))
+        )
     
-    # Create Choropleth Map
-    map_nl = px.choropleth(
-        df_2,
-        geojson=provincies,
-        locations="provincie",  # Column in the dataframe
-        featureidkey="properties.name",  # Match with GeoJSON province names
-        color="p100k-19-23",  # Change this to visualize another year
-        hover_name="provincie",
-        color_continuous_scale="Portland",
-        title="Suicide Rate Netherlands, 2029-2023, (CBS, 2023)"
-    )
+        profiler.plotly_chart("provinces", map_nl, use_container_width=True)
+        st.markdown("""___""") # make a stripe to seperate the graphs
     
-    # Update layout to adjust the map size
-    map_nl.update_geos(
-        fitbounds="locations",  # Adjust the map to fit the bounds of the locations
-        visible=False
-    )
+    province_section()
     
-    map_nl.update_layout(
-    template='simple_white',
-    plot_bgcolor='rgba(0, 0, 0, 0)',
-    paper_bgcolor='rgba(0, 0, 0, 0)',
-    margin=dict(l=0, r=0, t=50, b=0),
-    height=400,
-    geo=dict(
-        bgcolor='#D2D2D2'
-    ),
-    coloraxis_colorbar=dict(
-        title=dict(
-            text=color_title,
-            side="right",
-            font=dict(size=14)
+    #------------------------------------------------------------------------------------------------------------------
+    #WHO estimates after 2016
+    @st.fragment
+    def who_section():
+        profiler.start_section("who")
+        # Only the 8 useful columns of the WHO csv are read, in chunks, and cached
+        with profiler.stage("who", "load who data") as info:
+            who_years = load_who_years()
+            info["rows"] = len(who_years.df)
+        
+        st.markdown("### 6. Beyond 2016: the latest WHO estimates")
+        
+        st.write("""The world dataset used above stops in 2016. The World Health Organization publishes estimates of the
+                 crude suicide rate of every country up to 2021. These are modelled estimates, so every number comes with a 95% interval,
+                 which is wide for countries with little data. Hover over a country to see it.""")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            who_sex = st.radio("Select Sex for the WHO map", ("Both sexes", "Male", "Female"))
+        with col2:
+            selected_year_who = st.slider(
+                "Select Year for the WHO map",
+                min_value=who_years.min_year,
+                max_value=who_years.max_year,
+                value=who_years.max_year,
+                step=1
             )
+        
+        def build_who_map():
+            with profiler.stage("who", "aggregate") as info:
+                who_data = who_rates(who_years, selected_year_who, who_sex)
+                info["rows"] = len(who_data)
+            with profiler.stage("who", "plotly"):
+                return charts.who_map(who_data, selected_year_who, who_sex)
+        
+        fig_who = profiler.cached_figure(
+            "who", figures, ("who_map", data_version(WHO_CSV), selected_year_who, who_sex), build_who_map
         )
-    )
-
-    st.plotly_chart(map_nl, use_container_width=True)
-    st.markdown("""___""") # make a stripe to seperate the graphs
+        profiler.plotly_chart("who", fig_who)
+        
+        # Trend of one country, the Netherlands by default
+        countries = sorted(who_years.df["country"].cat.categories)
+        who_country = st.selectbox("Select Country", countries,
+                                   index=countries.index("Netherlands (Kingdom of the)") if "Netherlands (Kingdom of the)" in countries else 0)
+        fig_trend = profiler.cached_figure(
+            "who", figures, ("who_line", data_version(WHO_CSV), who_country),
+            lambda: charts.who_line(who_trend(who_years, who_country), who_country)
+        )
+        profiler.plotly_chart("who", fig_trend)
+        st.markdown("""___""") # make a stripe to seperate the graphs
+    
+    who_section()
+    
     #------------------------------------------------------------------------------------------------------------------
-    st.image("Pictures/psychological-support-concept-girl-feeling-anxiety-loneliness-helping-hand.jpg")
+    st.image(load_image("psychological-support-concept-girl-feeling-anxiety-loneliness-helping-hand.jpg"))
     st.markdown("### Conclusion")
     
     st.write("""Suicide remains a critical global issue, influenced by various factors such as gender, 
@@ -453,3 +492,6 @@ with col2:  # Everything inside col2 will be centered
              should not lead to complacency. Understanding these patterns is essential for developing more effective prevention strategies 
              and ensuring that those at risk receive the help they need.
              """)
+
+# Timing table of all sections, only when profiling is turned on (?profile=1 or DATASTORY_PROFILE=1)
+profiler.show_sidebar(figures)
@@ -0,0 +1,273 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import data_loader as dl
+from dimensions import load_dimensions, selection_mask
+
+
+# Dimensions of the cube, in sort order
+CUBE_INDEX = ["year", "country", "sex", "age"]
+GDP_COLUMN = "gdp_per_capita ($)"
+# Age group of the WHO rows that cover the whole population
+WHO_ALL_AGES = "All age groups (total)"
+
+
+class YearPartition:
+    """A table sorted by year, with the row range of every year.
+
+    partition[year] is a positional slice (a view), so looking up a year costs a dict
+    lookup instead of a scan over the year column.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        years = df.index.get_level_values("year") if "year" in df.index.names else df["year"]
+        years = years.to_numpy()
+        if np.any(np.diff(years) < 0):
+            raise ValueError("YearPartition needs a table that is sorted by year")
+        values, starts = np.unique(years, return_index=True)
+        stops = np.append(starts[1:], len(df))
+        self.ranges = {int(y): (int(start), int(stop)) for y, start, stop in zip(values, starts, stops)}
+        self.years = [int(y) for y in values]
+        self.min_year = self.years[0]
+        self.max_year = self.years[-1]
+        self.arrays = {}  # column name -> numpy array of the whole table
+
+    def __getitem__(self, year):
+        start, stop = self.ranges.get(year, (0, 0))
+        return self.df.iloc[start:stop]
+
+    def column(self, name, year=None):
+        """numpy view of one column, for one year or (year None) for the whole table."""
+        values = self.arrays.get(name)
+        if values is None:
+            values = self.arrays[name] = self.df[name].to_numpy()
+        if year is None:
+            return values
+        start, stop = self.ranges.get(year, (0, 0))
+        return values[start:stop]
+
+    def __contains__(self, year):
+        return year in self.ranges
+
+
+def build_cube(df, dims):
+    """Sum suicides and population per (year, country, sex, age).
+
+    The dimensions are stored as integer codes of the registry in `dims`. The gdp per capita
+    is a property of a country in a year, it is carried along as a column. The rows are
+    sorted, so every year is one contiguous block.
+    """
+    cube = df.groupby(CUBE_INDEX, observed=True).agg(
+        suicides_no=("suicides_no", "sum"),
+        population=("population", "sum"),
+        **{GDP_COLUMN: (GDP_COLUMN, "first")},
+    ).sort_index().reset_index()
+
+    codes = {f"{name}_code": dims[name].encode(cube[name]) for name in CUBE_INDEX[1:]}
+    return pd.DataFrame({
+        "year": cube["year"].to_numpy(),
+        **codes,
+        # int64: summing populations over countries does not fit in int32
+        "suicides_no": cube["suicides_no"].to_numpy("int64"),
+        "population": cube["population"].to_numpy("int64"),
+        GDP_COLUMN: cube[GDP_COLUMN].to_numpy(),
+    })
+
+
+@st.cache_resource(show_spinner=False)
+def _cached_cube(version):
+    return YearPartition(build_cube(dl.load_world_data(), load_dimensions()))
+
+
+@st.cache_resource(show_spinner=False)
+def _cached_world_years(version):
+    df = dl.load_world_data()
+    return YearPartition(df.sort_values("year", kind="stable").reset_index(drop=True))
+
+
+@st.cache_resource(show_spinner=False)
+def _cached_who_years(version):
+    df = dl.load_who_data()
+    return YearPartition(df.sort_values("year", kind="stable").reset_index(drop=True))
+
+
+def load_cube():
+    """The cube of the world dataset, partitioned by year.
+
+    Built once per process and shared by all sessions, so treat it as read-only.
+    """
+    return _cached_cube(dl.data_version(dl.WORLD_CSV))
+
+
+def load_world_years():
+    """The raw rows of the world dataset, partitioned by year (shared, read-only)."""
+    return _cached_world_years(dl.data_version(dl.WORLD_CSV))
+
+
+def load_who_years():
+    """The WHO crude suicide rates, partitioned by year (shared, read-only)."""
+    return _cached_who_years(dl.data_version(dl.WHO_CSV))
+
+
+#------------------------------------------------------------------------------------------------------------------
+# Queries on the cube, used by the charts
+
+def per_100k(data):
+    data["suicides_per_100k"] = data["suicides_no"] / data["population"] * 100000
+    return data
+
+
+def _year_codes(cube, year):
+    return {name: cube.column(f"{name}_code", year) for name in CUBE_INDEX[1:]}
+
+
+def country_totals(cube, dims, year, sex=None, ages=None):
+    """Suicides, population and suicides per 100k per country (world map)."""
+    codes = _year_codes(cube, year)
+    mask = selection_mask(dims, codes, {"sex": None if sex is None else [sex], "age": ages})
+    country = codes["country"]
+    suicides = cube.column("suicides_no", year)
+    population = cube.column("population", year)
+    if mask is not None:
+        country, suicides, population = country[mask], suicides[mask], population[mask]
+
+    # sums per country code in one pass, no groupby
+    n = len(dims["country"])
+    present = np.flatnonzero(np.bincount(country, minlength=n))
+    totals = pd.DataFrame({
+        "country": dims["country"].decode(present),
+        "suicides_no": np.bincount(country, suicides, n)[present].astype("int64"),
+        "population": np.bincount(country, population, n)[present].astype("int64"),
+    })
+    return per_100k(totals)
+
+
+def country_totals_by_year(cube, dims, sex=None, ages=None):
+    """country_totals() of every year at once, with a year column (animated world map).
+
+    One bincount over the whole cube on a combined (year, country) code, instead of one query per year.
+    """
+    codes = {name: cube.column(f"{name}_code") for name in CUBE_INDEX[1:]}
+    mask = selection_mask(dims, codes, {"sex": None if sex is None else [sex], "age": ages})
+    year = cube.column("year") - cube.min_year
+    country = codes["country"]
+    suicides = cube.column("suicides_no")
+    population = cube.column("population")
+    if mask is not None:
+        year, country, suicides, population = year[mask], country[mask], suicides[mask], population[mask]
+
+    n_country = len(dims["country"])
+    n = (cube.max_year - cube.min_year + 1) * n_country
+    key = year.astype(np.int64) * n_country + country
+    present = np.flatnonzero(np.bincount(key, minlength=n))
+    totals = pd.DataFrame({
+        "year": (present // n_country + cube.min_year).astype(cube.column("year").dtype),
+        "country": dims["country"].decode(present % n_country),
+        "suicides_no": np.bincount(key, suicides, n)[present].astype("int64"),
+        "population": np.bincount(key, population, n)[present].astype("int64"),
+    })
+    return per_100k(totals)
+
+
+def country_sex_totals(cube, dims, year, ages=None):
+    """Suicides per 100k per country and sex, with the gdp per capita (box and scatter plot)."""
+    codes = _year_codes(cube, year)
+    mask = selection_mask(dims, codes, {"age": ages})
+    country = codes["country"]
+    sex = codes["sex"]
+    suicides = cube.column("suicides_no", year)
+    population = cube.column("population", year)
+    gdp = cube.column(GDP_COLUMN, year)
+    if mask is not None:
+        country, sex, suicides, population, gdp = country[mask], sex[mask], suicides[mask], population[mask], gdp[mask]
+
+    # one combined code per (country, sex)
+    n_sex = len(dims["sex"])
+    n = len(dims["country"]) * n_sex
+    key = country.astype(np.int64) * n_sex + sex
+    present = np.flatnonzero(np.bincount(key, minlength=n))
+    gdp_per_country = np.zeros(len(dims["country"]), dtype=gdp.dtype)
+    gdp_per_country[country] = gdp  # the same for every row of a country in a year
+
+    totals = pd.DataFrame({
+        "country": dims["country"].decode(present // n_sex),
+        "sex": dims["sex"].decode(present % n_sex),
+        "suicides_no": np.bincount(key, suicides, n)[present].astype("int64"),
+        "population": np.bincount(key, population, n)[present].astype("int64"),
+        GDP_COLUMN: gdp_per_country[present // n_sex],
+    })
+    return per_100k(totals)
+
+
+def window_sums(cube, dims, windows):
+    """Suicides and population per (window, country, sex, age), for a list of (first, last) year windows.
+
+    The cube is sorted by year, so a window is one block of rows: one bincount per window over
+    that block. Windows may overlap, a year in both counts for both. Returns two arrays of shape
+    (windows, countries, sexes, ages).
+    """
+    shape = (len(dims["country"]), len(dims["sex"]), len(dims["age"]))
+    size = int(np.prod(shape))
+    years = cube.column("year")
+    suicides = np.zeros((len(windows), *shape))
+    population = np.zeros((len(windows), *shape))
+    for number, (first, last) in enumerate(windows):
+        rows = slice(np.searchsorted(years, first, "left"), np.searchsorted(years, last, "right"))
+        key = np.ravel_multi_index(tuple(cube.column(f"{name}_code")[rows] for name in CUBE_INDEX[1:]), shape)
+        suicides[number] = np.bincount(key, cube.column("suicides_no")[rows], size).reshape(shape)
+        population[number] = np.bincount(key, cube.column("population")[rows], size).reshape(shape)
+    return suicides, population
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _cached_window_sums(version, windows):
+    return window_sums(load_cube(), load_dimensions(), windows)
+
+
+def window_change(dims, sums, sex=None, ages=None):
+    """Suicides per 100k per country in two windows and the change, from window_sums().
+
+    Only countries with data in both windows are kept, sorted from the biggest decrease.
+    """
+    suicides, population = sums
+    sexes = dims["sex"].lookup([sex])[:-1] if sex is not None else slice(None)
+    age_groups = dims["age"].lookup(ages)[:-1] if ages is not None else slice(None)
+    # sum over the selected sexes and ages: (2, countries)
+    suicides = suicides[:, :, sexes][:, :, :, age_groups].sum(axis=(2, 3))
+    population = population[:, :, sexes][:, :, :, age_groups].sum(axis=(2, 3))
+
+    present = np.flatnonzero((population > 0).all(axis=0))
+    rates = suicides[:, present] / population[:, present] * 100000
+    change = pd.DataFrame({
+        "country": dims["country"].decode(present),
+        "rate_before": rates[0],
+        "rate_after": rates[1],
+        "change": rates[1] - rates[0],
+    })
+    change["change_pct"] = change["change"] / change["rate_before"].where(change["rate_before"] > 0) * 100
+    return change.sort_values("change", kind="stable").reset_index(drop=True)
+
+
+def load_window_change(window_before, window_after, sex=None, ages=None):
+    """window_change() of two (first, last) year windows of the world data.
+
+    The sums per window pair are computed once and shared, only the (cheap) selection of sex
+    and ages is done per call.
+    """
+    dims = load_dimensions()
+    sums = _cached_window_sums(dl.data_version(dl.WORLD_CSV), (tuple(window_before), tuple(window_after)))
+    return window_change(dims, sums, sex, ages)
+
+
+def who_rates(who_years, year, sex="Both sexes", age_group=WHO_ALL_AGES):
+    """WHO crude rate (with its 95% interval) of every country in one year, for one sex."""
+    rows = who_years[year]
+    return rows[(rows["sex"] == sex) & (rows["age_group"] == age_group)]
+
+
+def who_trend(who_years, country, age_group=WHO_ALL_AGES):
+    """All years of one country in the WHO data, for every sex."""
+    df = who_years.df
+    return df[(df["country"] == country) & (df["age_group"] == age_group)]
@@ -0,0 +1,174 @@
+"""Benchmark the data loading and aggregation of every section, without Streamlit.
+
+    python benchmark.py                       # writes benchmark_results.json
+    python benchmark.py --repeat 5 --output before.json
+    python benchmark.py --compare before.json # show the change against an earlier run
+    python benchmark.py --all-age-sets        # every subset of age groups instead of one at a time
+
+Every case is timed once cold (first call, peak memory measured with tracemalloc, which
+also makes the cold run slower) and then `--repeat` times warm. rows/sec is the number of input rows of the case
+divided by the median warm time.
+"""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import pandas as pd
+
+import aggregates as ag
+import cbs_ingest
+import data_loader as dl
+import dimensions
+
+
+SEXES = [None, "male", "female"]
+
+
+def age_sets(all_sets=False):
+    """None (All) plus every single age group, or every non-empty subset when all_sets is True."""
+    sizes = range(1, len(dl.AGE_CATEGORIES) + 1) if all_sets else [1]
+    sets = [None]
+    for size in sizes:
+        sets.extend(list(ages) for ages in itertools.combinations(dl.AGE_CATEGORIES, size))
+    return sets
+
+
+def measure(fn, repeat):
+    """Time fn once cold (with peak memory) and `repeat` times warm."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    cold = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        warm.append(time.perf_counter() - start)
+    return result, cold, warm, peak
+
+
+def run_case(results, name, fn, rows, repeat, calls=1):
+    """Time one case; `rows` is a number or a function of the result (when only that knows it)."""
+    result, cold, warm, peak = measure(fn, repeat)
+    if callable(rows):
+        rows = rows(result)
+    warm_median = statistics.median(warm) if warm else cold
+    results[name] = {
+        "calls": calls,
+        "rows": rows,
+        "cold_s": round(cold, 6),
+        "warm_median_s": round(warm_median, 6),
+        "warm_min_s": round(min(warm), 6) if warm else None,
+        "per_call_ms": round(warm_median / calls * 1000, 4),
+        "peak_memory_mb": round(peak / 2**20, 3),
+        "rows_per_s": round(rows / warm_median) if warm_median > 0 else None,
+    }
+    print(f"{name:<28} cold {cold * 1000:9.1f} ms   warm {warm_median * 1000:9.1f} ms   "
+          f"peak {peak / 2**20:7.1f} MB   {results[name]['rows_per_s'] or 0:>12,} rows/s")
+    return result
+
+
+def run(repeat, all_age_sets=False):
+    results = {}
+
+    # Loading
+    world = run_case(results, "load_world_csv", lambda: dl.read_world_data(dl.WORLD_CSV),
+                     rows=sum(1 for _ in open(dl.WORLD_CSV, encoding="utf-8")) - 1, repeat=repeat)
+    run_case(results, "load_who_csv", lambda: dl.read_who_data(dl.WHO_CSV),
+             rows=sum(1 for _ in open(dl.WHO_CSV, encoding="utf-8")) - 1, repeat=repeat)
+    cbs_tables = run_case(results, "load_cbs_workbook", lambda: cbs_ingest.read_workbook(dl.CBS_XLSX),
+                          rows=lambda tables: sum(len(table) for table in tables), repeat=repeat)
+    cbs_ingest.ensure_ingested(dl.CBS_XLSX)
+    run_case(results, "load_cbs_store", cbs_ingest.read_store,
+             rows=sum(len(table) for table in cbs_tables), repeat=repeat)
+    if dl.read_compiled("world", dl.WORLD_CSV) is not None:
+        run_case(results, "load_world_compiled", lambda: dl.read_compiled("world", dl.WORLD_CSV),
+                 rows=len(world), repeat=repeat)
+
+    # Shared structures, built once per process in the app
+    dims = run_case(results, "build_dimensions", lambda: dimensions.build_dimensions(world),
+                    rows=len(world), repeat=repeat)
+    cube = run_case(results, "build_cube", lambda: ag.YearPartition(ag.build_cube(world, dims)),
+                    rows=len(world), repeat=repeat)
+    run_case(results, "build_world_years",
+             lambda: ag.YearPartition(world.sort_values("year", kind="stable").reset_index(drop=True)),
+             rows=len(world), repeat=repeat)
+    all_rows = len(cube.df)
+
+    # Section 1: world map, every year x sex x age selection (the measure only changes the colour column)
+    ages = age_sets(all_age_sets)
+    combos = [(year, sex, a) for year in cube.years for sex in SEXES for a in ages]
+    run_case(results, "section1_map", lambda: [ag.country_totals(cube, dims, *combo) for combo in combos],
+             rows=all_rows * len(SEXES) * len(ages), repeat=repeat, calls=len(combos))
+
+    # Section 1 animated: all years at once, every sex x age selection
+    combos = [(sex, a) for sex in SEXES for a in ages]
+    run_case(results, "section1_animated", lambda: [ag.country_totals_by_year(cube, dims, *combo) for combo in combos],
+             rows=all_rows * len(combos), repeat=repeat, calls=len(combos))
+
+    # Section 2: box plot, every year x age selection
+    combos = [(year, a) for year in cube.years for a in ages]
+    run_case(results, "section2_box", lambda: [ag.country_sex_totals(cube, dims, *combo) for combo in combos],
+             rows=all_rows * len(ages), repeat=repeat, calls=len(combos))
+
+    # Section 3: scatter plot, every year
+    run_case(results, "section3_scatter", lambda: [ag.country_sex_totals(cube, dims, year) for year in cube.years],
+             rows=all_rows, repeat=repeat, calls=len(cube.years))
+
+    # Comparison of two periods: the sums per window pair, then every sex x age selection
+    windows = ((1996, 2005), (2006, 2015))
+    sums = run_case(results, "decades_sums", lambda: ag.window_sums(cube, dims, windows),
+                    rows=all_rows, repeat=repeat)
+    combos = [(sex, a) for sex in SEXES for a in ages]
+    run_case(results, "decades_change", lambda: [ag.window_change(dims, sums, *combo) for combo in combos],
+             rows=len(combos) * len(dims["country"]), repeat=repeat, calls=len(combos))
+
+    # Section 6: WHO map, every year x sex
+    who_years = ag.YearPartition(dl.read_who_data(dl.WHO_CSV).sort_values("year", kind="stable").reset_index(drop=True))
+    combos = [(year, sex) for year in who_years.years for sex in ("Both sexes", "Male", "Female")]
+    run_case(results, "section6_who_map", lambda: [ag.who_rates(who_years, *combo) for combo in combos],
+             rows=len(who_years.df), repeat=repeat, calls=len(combos))
+
+    return results
+
+
+def compare(results, path):
+    with open(path, "r", encoding="utf-8") as f:
+        before = json.load(f)["results"]
+    print(f"\nwarm median compared to {path}:")
+    for name, now in results.items():
+        if name in before:
+            change = now["warm_median_s"] / before[name]["warm_median_s"] - 1
+            print(f"{name:<28} {before[name]['warm_median_s'] * 1000:9.1f} -> {now['warm_median_s'] * 1000:9.1f} ms  ({change:+.0%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="number of warm runs of every case")
+    parser.add_argument("--output", default="benchmark_results.json", help="json file with the results")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--all-age-sets", action="store_true", help="benchmark all 63 subsets of age groups (slow)")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.all_age_sets)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "repeat": args.repeat,
+        "all_age_sets": args.all_age_sets,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,428 @@
+"""Ingestion of the CBS workbook into a typed store, read by sections 4 and 5.
+
+    python cbs_ingest.py                        # ingest Data/Zelfdodingen_1970-2023_NL.xlsx
+    python cbs_ingest.py new_release.xlsx       # add the new years of another release
+    python cbs_ingest.py --update-existing ...  # also take revised numbers of years already stored
+
+The sheets are found by their title and their header and footer rows by their content, not
+by fixed offsets, and both tables are checked before anything is written. Only years and
+regions that are not in the store yet are appended, so a new release adds its new rows and
+older years that a release no longer contains are kept. The app only opens a workbook that
+has not been ingested yet, otherwise it reads the (small) Parquet files of the store.
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import data_loader as dl
+from instrumentation import logger
+
+
+STORE_DIR = dl.DATA_DIR / "cbs_store"
+SEX_TABLE = STORE_DIR / "sex.parquet"
+REGION_TABLE = STORE_DIR / "regions.parquet"
+PERIOD_TABLE = STORE_DIR / "region_periods.parquet"
+INGESTED = STORE_DIR / "ingested.json"
+
+# Words in the title (cell A1) of the two sheets that are used
+SEX_TITLE = "naar geslacht"
+REGION_TITLE = "provincie"
+
+# Table 1: one row per year, a column per sex and measure
+SEXES = {"mannen": "Men", "vrouwen": "Women", "totaal": "Total"}
+MEASURES = [  # first match wins, the standardized rate is also "per 100 000"
+    ("gestandaardiseerd", "Standardized"),
+    ("per 100 000", "Per100k"),
+    ("absoluut", "Absolute"),
+]
+SEX_DTYPES = {"Year": "int32"}
+for _measure in ["Absolute", "Per100k", "Standardized"]:
+    for _sex in SEXES.values():
+        SEX_DTYPES[f"{_sex}_{_measure}"] = "int32" if _measure == "Absolute" else "float64"
+
+# Table 3: deaths per region and year, and totals over a period
+PROVINCES = ["Groningen", "Friesland (Fryslân)", "Drenthe", "Overijssel", "Flevoland", "Gelderland",
+             "Utrecht", "Noord-Holland", "Zuid-Holland", "Zeeland", "Noord-Brabant", "Limburg"]
+REGION_DTYPES = {"region": "str", "kind": "str", "year": "int32", "deaths": "int32"}
+PERIOD_DTYPES = {"region": "str", "kind": "str", "first_year": "int32", "last_year": "int32",
+                 "deaths": "int32", "per_100k": "float64"}
+
+YEAR_PATTERN = re.compile(r"^\s*(\d{4})(?:\.0)?\s*\*?\s*$")
+PERIOD_PATTERN = re.compile(r"^\s*(\d{4})\s*-\s*(\d{4})\s*\*?\s*$")
+
+
+class CbsLayoutError(ValueError):
+    """The workbook does not look like the CBS table we expect, nothing is written."""
+
+
+#------------------------------------------------------------------------------------------------------------------
+# Parsing, without fixed offsets
+
+def parse_year(value):
+    """1970, 2019.0 or "2023*" -> int, anything else -> None."""
+    match = YEAR_PATTERN.match(str(value))
+    if match is None:
+        return None
+    year = int(match.group(1))
+    return year if 1900 <= year <= 2100 else None
+
+
+def is_empty(value):
+    return value is None or (isinstance(value, float) and np.isnan(value)) or str(value).strip() == ""
+
+
+def find_sheet(workbook, title_word):
+    """Name of the sheet whose title contains `title_word`."""
+    for name in workbook.sheet_names:
+        title = workbook.parse(name, header=None, nrows=1)
+        if not title.empty and title_word in str(title.iloc[0, 0]).lower():
+            return name
+    raise CbsLayoutError(f"no sheet with {title_word!r} in its title")
+
+
+def column_labels(header, data):
+    """Every header text above a column, with group labels carried to the columns they span.
+
+    A group (e.g. "absoluut" over the men, women and total columns) ends at an empty column.
+    """
+    empty = [all(is_empty(v) for v in header[col]) and all(is_empty(v) for v in data[col]) for col in header.columns]
+    labels = {}
+    group = {}
+    for col, blank in zip(header.columns, empty):
+        if blank:
+            group = {}
+            continue
+        for row, value in header[col].items():
+            if not is_empty(value):
+                group[row] = str(value).strip().lower()
+        labels[col] = list(group.values())
+    return labels
+
+
+def parse_sex_sheet(raw):
+    """Table 1 (suicides per sex and year) in the layout of the app: Year, Men_Absolute, ..."""
+    years = raw[0].map(parse_year)
+    rows = np.flatnonzero(years.notna().to_numpy())
+    if len(rows) == 0:
+        raise CbsLayoutError("table 1 has no rows with a year")
+    first, last = rows[0], rows[-1]
+    if len(rows) != last - first + 1:
+        raise CbsLayoutError("table 1 has rows without a year between the years")
+    header, data = raw.iloc[:first], raw.iloc[first:last + 1]
+
+    columns = {}
+    for col, labels in column_labels(header, data).items():
+        sex = next((SEXES[label] for label in labels if label in SEXES), None)
+        measure = next((name for word, name in MEASURES if any(word in label for label in labels)), None)
+        if sex and measure:
+            columns[f"{sex}_{measure}"] = col
+    missing = [name for name in SEX_DTYPES if name != "Year" and name not in columns]
+    if missing:
+        raise CbsLayoutError(f"table 1 misses the columns {missing}")
+
+    df = pd.DataFrame({"Year": years.iloc[first:last + 1].to_numpy()})
+    for name in list(SEX_DTYPES)[1:]:
+        df[name] = pd.to_numeric(data[columns[name]], errors="coerce").to_numpy()
+    if df.isna().any().any():
+        raise CbsLayoutError("table 1 has empty or non-numeric values")
+    df = df.astype(SEX_DTYPES)
+
+    if not df["Year"].is_monotonic_increasing or df["Year"].duplicated().any():
+        raise CbsLayoutError("the years of table 1 are not unique and increasing")
+    if (df["Men_Absolute"] + df["Women_Absolute"] != df["Total_Absolute"]).any():
+        raise CbsLayoutError("in table 1 men + women is not the total")
+    return df
+
+
+def region_kinds(names):
+    """total, region (landsdeel), province or municipality, for the names in sheet order."""
+    kinds = []
+    seen = set()
+    for name in names:
+        if name.lower() == "totaal":
+            kinds.append("total")
+        elif name.endswith("-Nederland"):
+            kinds.append("region")
+        elif name in PROVINCES and name not in seen:
+            kinds.append("province")  # Utrecht is a province and, further down, a municipality
+        else:
+            kinds.append("municipality")
+        seen.add(name)
+    return kinds
+
+
+def parse_region_sheet(raw):
+    """Table 3 as (deaths per region and year, totals per region over the period)."""
+    # the header row has the years, and the period (e.g. "2019-2023*") of the totals
+    header_row = next((row for row in range(len(raw))
+                       if sum(parse_year(v) is not None for v in raw.iloc[row, 1:]) >= 1), None)
+    if header_row is None:
+        raise CbsLayoutError("table 3 has no header row with years")
+    year_columns = {col: parse_year(v) for col, v in raw.iloc[header_row, 1:].items() if parse_year(v) is not None}
+    period_columns = [col for col, v in raw.iloc[header_row, 1:].items() if PERIOD_PATTERN.match(str(v))]
+    if len(period_columns) != 1:
+        raise CbsLayoutError("table 3 has no (single) period column")
+    period_col = period_columns[0]
+    first_year, last_year = map(int, PERIOD_PATTERN.match(str(raw.iloc[header_row, period_col])).groups())
+
+    # data rows: a name and numbers, until the first row without a name (the footer)
+    start = next((row for row in range(header_row + 1, len(raw))
+                  if not is_empty(raw.iloc[row, 0]) and not is_empty(raw.iloc[row, list(year_columns)[0]])), None)
+    if start is None:
+        raise CbsLayoutError("table 3 has no data rows")
+    stop = start
+    while stop < len(raw) and not is_empty(raw.iloc[stop, 0]):
+        stop += 1
+    header, data = raw.iloc[header_row:start], raw.iloc[start:stop]
+
+    # the absolute number and the rate of the period are in the columns under the period
+    labels = column_labels(header, data)
+    absolute_col = next((col for col in labels if col >= period_col and "absoluut" in labels[col]), None)
+    rate_col = next((col for col in labels if col >= period_col and any("per 100 000" in l for l in labels[col])), None)
+    if absolute_col is None or rate_col is None:
+        raise CbsLayoutError("table 3 misses the absolute number or the rate of the period")
+
+    names = [str(name).strip() for name in data[0]]
+    kinds = region_kinds(names)
+    missing = sorted(set(PROVINCES) - {name for name, kind in zip(names, kinds) if kind == "province"})
+    if missing:
+        raise CbsLayoutError(f"table 3 misses the provinces {missing}")
+
+    deaths = {year: pd.to_numeric(data[col], errors="coerce").to_numpy() for col, year in year_columns.items()}
+    if any(np.isnan(values).any() or (values < 0).any() for values in deaths.values()):
+        raise CbsLayoutError("table 3 has empty, non-numeric or negative numbers of deaths")
+    regions = pd.DataFrame({
+        "region": np.repeat(names, len(deaths)),
+        "kind": np.repeat(kinds, len(deaths)),
+        "year": np.tile(list(deaths), len(names)),
+        "deaths": np.column_stack(list(deaths.values())).ravel(),
+    }).astype(REGION_DTYPES)
+
+    periods = pd.DataFrame({
+        "region": names,
+        "kind": kinds,
+        "first_year": first_year,
+        "last_year": last_year,
+        "deaths": pd.to_numeric(data[absolute_col], errors="coerce").to_numpy(),
+        "per_100k": pd.to_numeric(data[rate_col], errors="coerce").to_numpy(),
+    })
+    if periods[["deaths", "per_100k"]].isna().any().any():
+        raise CbsLayoutError("table 3 has empty totals for the period")
+    periods = periods.astype(PERIOD_DTYPES)
+
+    in_period = [year for year in deaths if first_year <= year <= last_year]
+    if len(in_period) == last_year - first_year + 1:
+        summed = sum(deaths[year] for year in in_period)
+        if (summed != periods["deaths"].to_numpy()).any():
+            raise CbsLayoutError("in table 3 the years do not add up to the total of the period")
+    return regions, periods
+
+
+def read_workbook(path=dl.CBS_XLSX):
+    """Parse and check both tables of a CBS workbook: (sex, regions, periods)."""
+    with pd.ExcelFile(path) as workbook:
+        sex = parse_sex_sheet(workbook.parse(find_sheet(workbook, SEX_TITLE), header=None))
+        regions, periods = parse_region_sheet(workbook.parse(find_sheet(workbook, REGION_TITLE), header=None))
+    return sex, regions, periods
+
+
+#------------------------------------------------------------------------------------------------------------------
+# The store
+
+def read_table(path, dtypes):
+    if not path.exists():
+        return None
+    return pd.read_parquet(path).astype(dtypes)
+
+
+def replace_file(path, write):
+    """Call write(temporary path) and rename the result to `path`, so a reader never sees half a file.
+
+    The temporary name is unique, every worker process can do this at the same time: the last
+    rename wins, and as a merge of the same workbook gives the same table that is fine.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def write_table(df, path):
+    replace_file(path, lambda tmp: df.to_parquet(tmp, index=False))
+
+
+def write_json(data, path):
+    def write(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    replace_file(path, write)
+
+
+def merge_rows(stored, new, keys, table, update_existing=False):
+    """Append the rows of `new` whose keys are not stored yet. Returns (table, rows added, rows revised).
+
+    Stored rows with other numbers in `new` (CBS revises the latest, provisional year) are
+    only replaced with update_existing, otherwise they are reported.
+    """
+    if stored is None:
+        return new.reset_index(drop=True), len(new), 0
+    stored_index = pd.MultiIndex.from_frame(stored[keys])
+    new_index = pd.MultiIndex.from_frame(new[keys])
+    is_new = ~new_index.isin(stored_index)
+
+    overlap = new[~is_new].set_index(keys)
+    current = stored.set_index(keys).loc[overlap.index]
+    revised = overlap.index[(overlap != current).any(axis=1).to_numpy()]
+    if len(revised) and not update_existing:
+        logger.warning("%s: %d stored rows have other numbers in this workbook, kept the stored ones "
+                       "(use --update-existing to take the new ones): %s",
+                       table, len(revised), ", ".join(map(str, revised[:5])))
+    elif len(revised):
+        stored = stored.set_index(keys)
+        stored.loc[revised] = overlap.loc[revised]
+        stored = stored.reset_index()[list(new.columns)]
+
+    merged = pd.concat([stored, new[is_new]], ignore_index=True)
+    return merged, int(is_new.sum()), len(revised) if update_existing else 0
+
+
+def ingested_workbooks():
+    try:
+        with open(INGESTED, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def ingest(path=dl.CBS_XLSX, update_existing=False):
+    """Parse a workbook and add its new rows to the store. Returns what was added per table."""
+    path = Path(path)
+    sex, regions, periods = read_workbook(path)  # raises CbsLayoutError before anything is written
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+
+    added = {}
+    for table, new, keys, dtypes in [
+        (SEX_TABLE, sex, ["Year"], SEX_DTYPES),
+        (REGION_TABLE, regions, ["region", "kind", "year"], REGION_DTYPES),
+        (PERIOD_TABLE, periods, ["region", "kind", "first_year", "last_year"], PERIOD_DTYPES),
+    ]:
+        merged, rows, revised = merge_rows(read_table(table, dtypes), new, keys, table.stem, update_existing)
+        if rows or revised or not table.exists():
+            write_table(merged.astype(dtypes), table)
+        added[table.stem] = rows
+
+    # written last, so a failed ingest is tried again the next time
+    workbooks = ingested_workbooks()
+    digest = dl.file_hash(path)
+    if digest not in workbooks or any(added.values()):
+        workbooks[digest] = {"file": path.name, "ingested": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                             "added": added}
+    write_json(workbooks, INGESTED)
+    logger.info("ingested %s: %s", path.name, added)
+    return added
+
+
+_lock = threading.Lock()  # sessions run in threads, only one of them ingests
+_checked = {}  # (path, file version) of a workbook -> True when it is in the store, False when it cannot be
+
+
+def ensure_ingested(path=dl.CBS_XLSX):
+    """Ingest `path` when this version of it is not in the store yet (cheap when it is).
+
+    Returns False when the store cannot be written (e.g. a read-only deploy), the tables then
+    have to come from the workbook itself.
+    """
+    key = (str(path), dl.file_version(path))
+    if key in _checked:
+        return _checked[key]
+    with _lock:
+        if key not in _checked:
+            try:
+                if dl.file_hash(path) not in ingested_workbooks() or not SEX_TABLE.exists():
+                    ingest(path)
+                _checked[key] = True
+            except OSError as error:
+                logger.warning("cannot write the CBS store (%s), reading %s in memory instead", error, Path(path).name)
+                _checked[key] = False
+    return _checked[key]
+
+
+def store_version():
+    """Cache key that changes whenever the store changes."""
+    return tuple(dl.file_version(path) if path.exists() else None for path in (SEX_TABLE, REGION_TABLE, PERIOD_TABLE))
+
+
+def cbs_version(path=dl.CBS_XLSX):
+    """Cache key of what load_cbs_tables(path) returns: the store, or the workbook when it is read in memory."""
+    if ensure_ingested(path):
+        return store_version()
+    return ("workbook", dl.data_version(path))
+
+
+def province_table(regions, periods):
+    """Table of section 5: a row per province, deaths per year and the totals of the latest period.
+
+    The columns are named like the CBS sheet: "2019", ..., "absoluut-19-23", "p100k-19-23".
+    """
+    latest = periods[periods["kind"] == "province"]
+    latest = latest[latest["last_year"] == latest["last_year"].max()]
+    first, last = int(latest["first_year"].iloc[0]), int(latest["last_year"].iloc[0])
+    years = regions[(regions["kind"] == "province") & regions["year"].between(first, last)]
+    df = years.pivot(index="region", columns="year", values="deaths")
+    df.columns = [str(year) for year in df.columns]
+    df = df.reindex(latest["region"]).reset_index().rename(columns={"region": "provincie"})
+    span = f"{first % 100:02d}-{last % 100:02d}"
+    df[f"absoluut-{span}"] = latest["deaths"].to_numpy()
+    df[f"p100k-{span}"] = latest["per_100k"].to_numpy()
+    return df.astype({column: "int32" for column in df.columns if column[:1].isdigit() or column.startswith("absoluut")})
+
+
+def read_store():
+    """(table per sex, table per province) as the sections use them, read from the store."""
+    sex = read_table(SEX_TABLE, SEX_DTYPES)
+    return sex, province_table(read_table(REGION_TABLE, REGION_DTYPES), read_table(PERIOD_TABLE, PERIOD_DTYPES))
+
+
+def read_workbook_tables(path=dl.CBS_XLSX):
+    """The same tables as read_store(), from one workbook (when the store cannot be written)."""
+    sex, regions, periods = read_workbook(path)
+    return sex.astype(SEX_DTYPES), province_table(regions.astype(REGION_DTYPES), periods.astype(PERIOD_DTYPES))
+
+
+@st.cache_data(show_spinner=False)
+def _cached_cbs_tables(version):
+    return read_store()
+
+
+@st.cache_data(show_spinner=False)
+def _cached_workbook_tables(path, version):
+    return read_workbook_tables(path)
+
+
+def load_cbs_tables(path=dl.CBS_XLSX):
+    """CBS tables for the Netherlands from the store: (per sex, per province for the latest period)."""
+    if ensure_ingested(path):
+        return _cached_cbs_tables(store_version())
+    return _cached_workbook_tables(str(path), dl.data_version(path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("workbooks", nargs="*", default=[str(dl.CBS_XLSX)], help="CBS workbooks to ingest, oldest first")
+    parser.add_argument("--update-existing", action="store_true", help="replace stored numbers that were revised")
+    args = parser.parse_args()
+    for workbook in args.workbooks:
+        print(f"{Path(workbook).name}: added {ingest(workbook, args.update_existing)}")
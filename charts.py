@@ -0,0 +1,221 @@
+import numpy as np
+import plotly.express as px
+
+
+# Colours used for the sexes in every chart
+SEX_COLORS = {
+    "male": "rgb(0,150,255)",   # Male = Blue
+    "female": "rgb(255,16,240)" # Female = Pink
+}
+
+
+def map_layout(fig, color_title):
+    """Shared layout of both choropleth maps."""
+    fig.update_layout(
+        template='simple_white',
+        plot_bgcolor='rgba(0, 0, 0, 0)',
+        paper_bgcolor='rgba(0, 0, 0, 0)',
+        margin=dict(l=0, r=0, t=50, b=0),
+        height=400,
+        geo=dict(
+            bgcolor='#D2D2D2'
+        ),
+        coloraxis_colorbar=dict(
+            title=dict(
+                text=color_title,
+                side="right",
+                font=dict(size=14)
+            )
+        )
+    )
+    return fig
+
+
+def world_map(map_data, color_column, color_title, year):
+    """Choropleth of section 1."""
+    fig = px.choropleth(
+        map_data,
+        locations="iso3",  # ISO-3 codes, resolved once in country_keys.py
+        locationmode="ISO-3",  # Matches the codes exactly, no name matching in Plotly
+        color=color_column,  # Use the selected measure for color intensity
+        hover_name="country",  # Display country name on hover
+        color_continuous_scale="Portland",  # Adjust color scale
+        title=f"{color_title} in {year}, (WHO, 2016)"  # Title reflecting the selected year and measure
+    )
+    return map_layout(fig, color_title)
+
+
+def world_map_animated(map_data, color_column, color_title):
+    """Choropleth of section 1 with one frame per year and a play button."""
+    fig = px.choropleth(
+        map_data,
+        locations="iso3",
+        locationmode="ISO-3",
+        color=color_column,
+        hover_name="country",
+        animation_frame="year",  # one frame per year, all sent to the browser at once
+        range_color=(0, map_data[color_column].max()),  # the same colours in every frame
+        color_continuous_scale="Portland",
+        title=f"{color_title} {map_data['year'].min()}-{map_data['year'].max()}, (WHO, 2016)"
+    )
+    return map_layout(fig, color_title)
+
+
+def window_title(before, after):
+    return f"Change in suicides per 100k, {before[0]}-{before[1]} vs {after[0]}-{after[1]}, (WHO, 2016)"
+
+
+def change_bars(change, before, after):
+    """Diverging bar chart of the comparison of two periods, decreases in green, increases in red."""
+    change = change.assign(trend=np.where(change["change"] < 0, "Decreased", "Increased"))
+    fig = px.bar(
+        change,
+        x="change",
+        y="country",
+        orientation="h",
+        color="trend",
+        color_discrete_map={"Decreased": "rgb(17,217,87)", "Increased": "rgb(230,40,40)"},
+        hover_data={"rate_before": ":.1f", "rate_after": ":.1f", "change_pct": ":.0f", "trend": False},
+        labels={"change": "Change in suicides per 100k", "country": "", "trend": "",
+                "rate_before": f"{before[0]}-{before[1]}", "rate_after": f"{after[0]}-{after[1]}",
+                "change_pct": "Change (%)"},
+        title=window_title(before, after)
+    )
+    fig.update_layout(height=max(400, 16 * len(change) + 120),
+                      yaxis=dict(categoryorder="array", categoryarray=list(change["country"])[::-1]))
+    return fig
+
+
+def change_map(change, before, after):
+    """Choropleth of the comparison of two periods, with the colour scale centred on no change."""
+    fig = px.choropleth(
+        change,
+        locations="iso3",
+        locationmode="ISO-3",
+        color="change",
+        hover_name="country",
+        hover_data={"iso3": False, "rate_before": ":.1f", "rate_after": ":.1f", "change": ":.1f"},
+        labels={"rate_before": f"{before[0]}-{before[1]}", "rate_after": f"{after[0]}-{after[1]}",
+                "change": "Change"},
+        color_continuous_scale="RdYlGn_r",
+        color_continuous_midpoint=0,
+        title=window_title(before, after)
+    )
+    return map_layout(fig, "Change per 100k")
+
+
+def sex_box(box_data, year):
+    """Box plot of section 2 (always suicides per 100k)."""
+    fig = px.box(
+        box_data,
+        x="sex",
+        y="suicides_per_100k",
+        color="sex",
+        category_orders={"sex": ["female", "male"]},  # Ensure order remains consistent
+        color_discrete_map=SEX_COLORS,
+        points="all",  # Show all individual points
+        title=f"Sum worldwide Suicides per 100k in {year} comparing sex, (WHO, 2016)",
+        labels={"suicides_per_100k": "Suicides per 100k", "sex": "Sex"},
+        hover_data=["country"]  # Show country on hover
+    )
+
+    fig.update_layout(
+        template='simple_white',
+        plot_bgcolor='rgba(0, 0, 0, 0)',
+        paper_bgcolor='rgba(0, 0, 0, 0)',
+        margin=dict(l=0, r=0, t=50, b=0),  # margins so title shows
+        height=400
+    )
+    return fig
+
+
+def gdp_scatter(scatter_data):
+    """Scatter plot of section 3."""
+    return px.scatter(
+        scatter_data,
+        x="gdp_per_capita ($)",
+        y="suicides_per_100k",
+        color="sex",
+        category_orders={"Sex": ["female", "male"]},  # Ensure order remains consistent
+        color_discrete_map=SEX_COLORS,
+        title="Suicides per 100,000 People vs GDP per Capita, (World Bank, 2018),(WHO, 2016)",
+        labels={"gdp_per_capita ($)": "GDP per Capita", "suicides_per_100k": "Suicides per 100,000 People"},
+        hover_data=["country", "sex"]
+    )
+
+
+def who_map(who_data, year, sex):
+    """Choropleth of section 6, the WHO crude rates with their 95% interval on hover."""
+    fig = px.choropleth(
+        who_data,
+        locations="iso3",  # the WHO data has its own ISO-3 codes
+        locationmode="ISO-3",
+        color="value",
+        hover_name="country",
+        hover_data={"iso3": False, "value": ":.2f", "value_low": ":.2f", "value_high": ":.2f"},
+        labels={"value": "Suicides per 100k", "value_low": "Lower bound", "value_high": "Upper bound"},
+        color_continuous_scale="Portland",
+        title=f"Crude suicide rate in {year}, {sex.lower()}, (WHO, 2025)"
+    )
+    return map_layout(fig, "Suicides per 100k")
+
+
+def who_line(trend, country):
+    """Line chart of section 6, one line per sex with a band for the 95% interval."""
+    colors = {"Male": SEX_COLORS["male"], "Female": SEX_COLORS["female"], "Both sexes": "rgb(17,217,87)"}
+    fig = px.line(trend, x="year", y="value", color="sex",
+                  color_discrete_map=colors,
+                  category_orders={"sex": ["Both sexes", "Male", "Female"]},
+                  title=f"Crude suicide rate in {country}, with 95% interval, (WHO, 2025)",
+                  labels={"value": "Suicides per 100k", "year": "Year", "sex": "Sex"})
+    for sex, rows in trend.groupby("sex", observed=True):
+        color = colors.get(sex, "grey")
+        fig.add_scatter(x=list(rows["year"]) + list(rows["year"])[::-1],
+                        y=list(rows["value_high"]) + list(rows["value_low"])[::-1],
+                        fill="toself", fillcolor=color.replace("rgb", "rgba").replace(")", ",0.15)"),
+                        line=dict(width=0), hoverinfo="skip", showlegend=False)
+    return fig
+
+
+def nl_line(df_1):
+    """Line chart of section 4."""
+    fig = px.line(data_frame=df_1,
+                  x="Year",
+                  y=["Men_Standardized", "Women_Standardized", "Total_Standardized"],
+                  title="""Suicide per 100K people in the Netherlands<br><sup>
+             standardized by age from 2023</sup>""",
+                  labels={"value": "Suicides per 100K", "variable": "Sex"},
+                  color_discrete_map={
+                      "Men_Standardized": SEX_COLORS["male"],
+                      "Women_Standardized": SEX_COLORS["female"],
+                      "Total_Standardized": "rgb(17,217,87)"
+                  })
+
+    # Rename legend labels
+    fig.for_each_trace(lambda t: t.update(name={
+        "Men_Standardized": "Men",
+        "Women_Standardized": "Women",
+        "Total_Standardized": "Total"
+    }.get(t.name, t.name)))
+    return fig
+
+
+def nl_map(df_2, provincies):
+    """Province map of section 5 (suicides per 100k)."""
+    fig = px.choropleth(
+        df_2,
+        geojson=provincies,
+        locations="provincie",  # Column in the dataframe
+        featureidkey="properties.name",  # Match with GeoJSON province names
+        color=next(column for column in df_2.columns if column.startswith("p100k-")),  # rate of the latest period
+        hover_name="provincie",
+        color_continuous_scale="Portland",
+        title="Suicide Rate Netherlands, 2029-2023, (CBS, 2023)"
+    )
+
+    # Update layout to adjust the map size
+    fig.update_geos(
+        fitbounds="locations",  # Adjust the map to fit the bounds of the locations
+        visible=False
+    )
+    return map_layout(fig, "Suicides per 100k")
@@ -0,0 +1,82 @@
+"""Compile the raw datasets in Data/ into a typed Arrow (Feather) snapshot.
+
+Run this after changing anything in Data/ or Pictures/:
+
+    python compile_data.py
+
+The app memory-maps the files in Data/compiled/ at startup. When a source no longer
+matches the hash in the manifest, the app falls back to parsing the raw file.
+"""
+import argparse
+import json
+import time
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import data_loader as dl
+import geo_assets
+import image_assets
+
+
+def write_table(df, name):
+    # uncompressed, otherwise the file can not be memory-mapped
+    path = dl.COMPILED_DIR / f"{name}.arrow"
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    feather.write_feather(table, path, compression="uncompressed")
+    return path.name
+
+
+def source_entry(path):
+    mtime_ns, size = dl.file_version(path)
+    return {"sha256": dl.file_hash(path), "size": size, "mtime_ns": mtime_ns}
+
+
+def compile_data(tolerance=geo_assets.DEFAULT_TOLERANCE, precision=geo_assets.DEFAULT_PRECISION):
+    """Parse every source once and write the snapshot plus its manifest."""
+    dl.COMPILED_DIR.mkdir(exist_ok=True)
+
+    # the CBS workbook has its own store, see cbs_ingest.py
+    tables = {
+        "world": (dl.read_world_data(dl.WORLD_CSV), dl.WORLD_CSV),
+        "who": (dl.read_who_data(dl.WHO_CSV), dl.WHO_CSV),
+    }
+
+    manifest = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "sources": {}, "tables": {}, "assets": {},
+                "images": {}}
+    for name, (df, source) in tables.items():
+        manifest["sources"][source.name] = source_entry(source)
+        manifest["tables"][name] = {"file": write_table(df, name), "source": source.name, "rows": len(df)}
+        print(f"{name:<13} {len(df):>6} rows  <- {source.name}")
+
+    # Province borders for the map of section 5, simplified and pre-encoded
+    source = dl.PROVINCES_GEOJSON
+    asset = geo_assets.write_simplified_geojson(tolerance, precision)
+    manifest["sources"][source.name] = source_entry(source)
+    manifest["assets"]["provinces_simplified"] = {"file": asset.name, "source": source.name,
+                                                  "tolerance": tolerance, "precision": precision}
+    print(f"{'provinces':<13} {source.stat().st_size:>6} -> {asset.stat().st_size} bytes  <- {source.name}")
+
+    # Pictures, resized to the width they are shown at
+    for name, entry in image_assets.write_image_variants().items():
+        source = image_assets.PICTURES_DIR / name
+        manifest["sources"][name] = source_entry(source)
+        manifest["images"][name] = entry
+        sizes = ", ".join(f"{fmt} {size}" for fmt, size in entry["bytes"].items())
+        print(f"{'picture':<13} {source.stat().st_size:>6} -> {sizes} bytes  <- {name}")
+
+    # written last, so a half finished compile is never seen as fresh
+    with open(dl.MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"manifest written to {dl.MANIFEST}")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tolerance", type=float, default=geo_assets.DEFAULT_TOLERANCE,
+                        help="simplification tolerance of the province borders, in degrees")
+    parser.add_argument("--precision", type=int, default=geo_assets.DEFAULT_PRECISION,
+                        help="decimals kept of the province coordinates")
+    args = parser.parse_args()
+    compile_data(args.tolerance, args.precision)
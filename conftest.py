@@ -0,0 +1 @@
+# Makes the modules in this folder importable from tests/ when pytest is run from here.
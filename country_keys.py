@@ -0,0 +1,76 @@
+import re
+import unicodedata
+
+import streamlit as st
+
+import data_loader as dl
+from instrumentation import logger
+
+
+# Names in Suicide_rates.csv that the WHO writes differently (after normalize_name)
+COUNTRY_ALIASES = {
+    "Czech Republic": "Czechia",
+    "Turkey": "Türkiye",
+    "United Kingdom": "United Kingdom of Great Britain and Northern Ireland",
+    "United States": "United States of America",
+}
+
+# Countries and territories that are not in the WHO data at all
+ISO3_FALLBACK = {
+    "Aruba": "ABW",
+    "Dominica": "DMA",
+    "Macau": "MAC",
+    "Saint Kitts and Nevis": "KNA",
+    "San Marino": "SMR",
+}
+
+
+def normalize_name(name):
+    """Comparable form of a country name: no accents, case, "(...)", "the" or punctuation."""
+    name = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode()
+    name = re.sub(r"\(.*?\)", " ", name.casefold()).replace("&", " and ")
+    words = re.sub(r"[^a-z0-9]+", " ", name).split()
+    return " ".join(word for word in words if word != "the")
+
+
+def build_country_keys(countries, who):
+    """Map every name in `countries` to an ISO-3 code.
+
+    The WHO data (Location and SpatialDimValueCode) is the source of the codes.
+    Returns (dict name -> ISO-3, list of names that could not be matched).
+    """
+    who_codes = who[["country", "iso3"]].drop_duplicates().astype(str)
+    by_name = dict(zip(who_codes["country"], who_codes["iso3"]))
+    by_normalized = {normalize_name(name): code for name, code in by_name.items()}
+
+    keys = {}
+    unmatched = []
+    for country in countries:
+        name = COUNTRY_ALIASES.get(country, country)
+        code = by_name.get(name) or by_normalized.get(normalize_name(name)) or ISO3_FALLBACK.get(country)
+        if code is None:
+            unmatched.append(country)
+        else:
+            keys[country] = code
+    return keys, unmatched
+
+
+@st.cache_resource(show_spinner=False)
+def _cached_country_keys(version):
+    countries = dl.load_world_data()["country"].cat.categories
+    keys, unmatched = build_country_keys(countries, dl.load_who_data())
+    if unmatched:
+        logger.warning("no ISO-3 code for %d countries, they are not shown on the map: %s",
+                       len(unmatched), ", ".join(unmatched))
+    return keys, unmatched
+
+
+def load_country_keys():
+    """(dict country -> ISO-3, unmatched names) for the world dataset, built once per process."""
+    return _cached_country_keys((dl.data_version(dl.WORLD_CSV), dl.data_version(dl.WHO_CSV)))
+
+
+def with_iso3(data, keys):
+    """Add an iso3 column to a table with a country column, dropping countries without a code."""
+    data = data.assign(iso3=data["country"].map(keys).astype("object"))
+    return data[data["iso3"].notna()]
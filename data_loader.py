@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+from pandas.api.types import union_categoricals
+import streamlit as st
+
+
+# Folder with all the datasets of the story
+DATA_DIR = Path(__file__).resolve().parent / "Data"
+
+WORLD_CSV = DATA_DIR / "Suicide_rates.csv"
+WHO_CSV = DATA_DIR / "suicide_data_OWD.csv"
+CBS_XLSX = DATA_DIR / "Zelfdodingen_1970-2023_NL.xlsx"
+PROVINCES_GEOJSON = DATA_DIR / "provinces_nederland.geojson"
+
+# Snapshot made by compile_data.py, see read_compiled()
+COMPILED_DIR = DATA_DIR / "compiled"
+MANIFEST = COMPILED_DIR / "manifest.json"
+
+# Fixed order of the categories, so filters and legends always look the same
+SEX_CATEGORIES = ["female", "male"]
+AGE_CATEGORIES = ["5-14 years", "15-24 years", "25-34 years", "35-54 years", "55-74 years", "75+ years"]
+GENERATION_CATEGORIES = ["G.I. Generation", "Silent", "Boomers", "Generation X", "Millenials", "Generation Z"]
+
+WORLD_DTYPES = {
+    "country": "category",
+    "year": "int32",
+    "sex": pd.CategoricalDtype(SEX_CATEGORIES),
+    "age": pd.CategoricalDtype(AGE_CATEGORIES, ordered=True),
+    "suicides_no": "int32",
+    "population": "int32",
+    "suicides/100k pop": "float64",
+    "country-year": "category",
+    "HDI for year": "float64",
+    "gdp_for_year ($)": "int64",  # up to ~18 trillion, does not fit in int32
+    "gdp_per_capita ($)": "int32",
+    "generation": pd.CategoricalDtype(GENERATION_CATEGORIES, ordered=True),
+}
+
+# Only these columns of the WHO csv are used, the rest is (mostly) empty
+WHO_COLUMNS = {
+    "Location": "country",
+    "SpatialDimValueCode": "iso3",
+    "Period": "year",
+    "Dim1": "sex",
+    "Dim2": "age_group",
+    "FactValueNumeric": "value",
+    "FactValueNumericLow": "value_low",
+    "FactValueNumericHigh": "value_high",
+}
+WHO_DTYPES = {
+    "country": "category",
+    "iso3": "category",
+    "year": "int32",
+    "sex": "category",
+    "age_group": "category",
+    "value": "float32",  # rates with two decimals, float32 halves the memory
+    "value_low": "float32",
+    "value_high": "float32",
+}
+# Display string like "0.2 [0.1-0.3]", used when the numeric columns are empty
+WHO_DISPLAY_COLUMN = "Value"
+WHO_DISPLAY_PATTERN = r"^\s*(-?\d+(?:\.\d+)?)\s*\[\s*(-?\d+(?:\.\d+)?)\s*-\s*(-?\d+(?:\.\d+)?)\s*\]\s*$"
+# Rows per chunk of the WHO reader, only one chunk of raw text is in memory at a time
+WHO_CHUNKSIZE = 100_000
+
+def file_version(path):
+    """Return a key that changes whenever the file on disk changes."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_hash(path):
+    """sha256 of a file, used by the manifest of the compiled snapshot."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def data_version(path):
+    """Cache key for everything derived from `path` (the source and the compiled snapshot)."""
+    # the snapshot can be (re)compiled while the app runs, so it is part of the key too
+    manifest = file_version(MANIFEST) if MANIFEST.exists() else None
+    return file_version(path), manifest
+
+
+#------------------------------------------------------------------------------------------------------------------
+# Parsers, these do the actual (slow) reading of the files
+
+def read_world_data(path=WORLD_CSV):
+    """Read the Kaggle suicide rates csv with explicit dtypes."""
+    df = pd.read_csv(path, thousands=",", encoding="utf-8-sig")
+    # the csv has spaces around " gdp_for_year ($) "
+    df.columns = df.columns.str.strip()
+    return df.astype(WORLD_DTYPES)
+
+
+def parse_who_values(display):
+    """Split WHO display strings like "0.2 [0.1-0.3]" into value, value_low and value_high.
+
+    Vectorized with one regular expression over the whole column, strings that do not match give NaN.
+    """
+    parts = display.astype("string").str.extract(WHO_DISPLAY_PATTERN)
+    parts.columns = ["value", "value_low", "value_high"]
+    return parts.astype("float32")
+
+
+def iter_who_chunks(path=WHO_CSV, chunksize=WHO_CHUNKSIZE):
+    """Read the WHO csv in chunks of typed rows, only the columns in WHO_COLUMNS.
+
+    The other ~25 columns are never parsed. Missing numbers are filled in from the display string.
+    """
+    reader = pd.read_csv(path, usecols=list(WHO_COLUMNS) + [WHO_DISPLAY_COLUMN], chunksize=chunksize,
+                         dtype={column: "category" for column, name in WHO_COLUMNS.items()
+                                if WHO_DTYPES[name] == "category"})
+    with reader:
+        for chunk in reader:
+            display = chunk.pop(WHO_DISPLAY_COLUMN)
+            chunk = chunk.rename(columns=WHO_COLUMNS)[list(WHO_COLUMNS.values())]
+            missing = chunk[["value", "value_low", "value_high"]].isna().any(axis=1)
+            if missing.any():
+                parsed = parse_who_values(display[missing])
+                chunk.loc[missing, parsed.columns] = chunk.loc[missing, parsed.columns].fillna(parsed)
+            yield chunk.astype(WHO_DTYPES)
+
+
+def read_who_data(path=WHO_CSV, chunksize=WHO_CHUNKSIZE):
+    """Read the WHO crude suicide rates (2000-2021), only the useful columns.
+
+    The file is read in chunks, so the memory needed is the typed result plus one chunk of text.
+    """
+    chunks = list(iter_who_chunks(path, chunksize))
+    if len(chunks) == 1:
+        return chunks[0]
+    # every chunk has its own categories, merge them so the columns stay categorical
+    df = pd.DataFrame({
+        column: (union_categoricals([chunk[column] for chunk in chunks]) if dtype == "category"
+                 else np.concatenate([chunk[column].to_numpy() for chunk in chunks]))
+        for column, dtype in WHO_DTYPES.items()
+    })
+    return df
+
+
+def read_geojson(path=PROVINCES_GEOJSON):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+#------------------------------------------------------------------------------------------------------------------
+# Compiled snapshot. compile_data.py stores every table as an uncompressed Arrow (Feather) file,
+# which is read with its dtypes instead of parsed (to_pandas() copies it into pandas memory).
+# The manifest records the hash of the source each table was made from, so a changed source
+# simply falls back to the raw parser above.
+
+def _source_is_fresh(path, recorded):
+    version = file_version(path)
+    if version == (recorded["mtime_ns"], recorded["size"]):
+        return True
+    # e.g. a fresh git checkout changes the mtime but not the content
+    return version[1] == recorded["size"] and file_hash(path) == recorded["sha256"]
+
+
+def _compiled_path(kind, name, source, variant=None):
+    # path of a compiled table/asset (or one of its variants), or None when it is missing or older than its source
+    try:
+        with open(MANIFEST, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        entry = manifest[kind][name]
+        recorded = manifest["sources"][entry["source"]]
+        file = entry["variants"][variant] if variant else entry["file"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+    if entry["source"] != Path(source).name or not _source_is_fresh(source, recorded):
+        return None
+    return COMPILED_DIR / file
+
+
+def read_compiled(name, source):
+    """Return the compiled table `name` if it is up to date with `source`, else None."""
+    path = _compiled_path("tables", name, source)
+    if path is None:
+        return None
+    try:
+        return feather.read_table(path, memory_map=True).to_pandas()
+    except OSError:
+        return None
+
+
+def read_compiled_asset(name, source):
+    """Return the text of the compiled asset `name` if it is up to date with `source`, else None."""
+    path = _compiled_path("assets", name, source)
+    if path is None:
+        return None
+    try:
+        return path.read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+
+def read_compiled_image(name, source, image_format=None):
+    """Return the bytes of the compiled image `name` (the served one, or `image_format`) if it is up to date
+    with `source`, else None."""
+    path = _compiled_path("images", name, source, image_format)
+    if path is None:
+        return None
+    try:
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+#------------------------------------------------------------------------------------------------------------------
+# Cached loaders, shared by every session of the app. The file version is part of the
+# cache key, so changing a file in Data/ automatically triggers a fresh read.
+
+# cache_resource: one copy per process, shared by every builder and session instead of an
+# unpickled copy per call. The frames are read-only, every user copies before changing anything.
+@st.cache_resource(show_spinner=False)
+def _cached_world_data(path, version):
+    df = read_compiled("world", path)
+    return df if df is not None else read_world_data(path)
+
+
+@st.cache_resource(show_spinner=False)
+def _cached_who_data(path, version):
+    df = read_compiled("who", path)
+    return df if df is not None else read_who_data(path)
+
+
+@st.cache_resource(show_spinner=False)
+def _cached_geojson(path, version):
+    # cache_resource: the geojson is never changed, so no need to copy it every rerun
+    return read_geojson(path)
+
+
+def load_world_data(path=WORLD_CSV):
+    """World dataset (1985-2016) with typed columns (shared, read-only)."""
+    return _cached_world_data(str(path), data_version(path))
+
+
+def load_who_data(path=WHO_CSV):
+    """WHO crude suicide rates per country (2000-2021) (shared, read-only)."""
+    return _cached_who_data(str(path), data_version(path))
+
+
+def load_provinces_geojson(path=PROVINCES_GEOJSON):
+    """GeoJSON with the Dutch provinces."""
+    return _cached_geojson(str(path), file_version(path))
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import data_loader as dl
+
+
+# Dimensions of the world dataset that get integer codes
+DIMENSIONS = ["country", "sex", "age", "generation"]
+
+
+class Dimension:
+    """The labels of one dimension, each with a fixed integer code (its position).
+
+    Filters work on the codes: a selection of labels becomes a boolean lookup table
+    indexed by code, so filtering a column is one numpy take, whatever the labels are.
+    """
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = list(labels)
+        self.code_of = {label: code for code, label in enumerate(self.labels)}
+        self.dtype = np.int8 if len(self.labels) < 128 else np.int16
+
+    def __len__(self):
+        return len(self.labels)
+
+    def encode(self, values):
+        """Codes of a column of labels (-1 for unknown labels)."""
+        return pd.Categorical(values, categories=self.labels).codes.astype(self.dtype)
+
+    def decode(self, codes):
+        """Labels of an array of codes, as a categorical."""
+        return pd.Categorical.from_codes(codes, categories=self.labels)
+
+    def lookup(self, labels):
+        """Boolean table with True at the codes of the selected labels.
+
+        It has one extra False entry at the end, so the code -1 (unknown) is never selected.
+        """
+        table = np.zeros(len(self.labels) + 1, dtype=bool)
+        table[[self.code_of[label] for label in labels if label in self.code_of]] = True
+        return table
+
+
+def build_dimensions(df):
+    """Registry of all dimensions, with the labels in the category order of the dataset."""
+    dims = {}
+    for name in DIMENSIONS:
+        column = df[name]
+        labels = column.cat.categories if isinstance(column.dtype, pd.CategoricalDtype) else sorted(column.unique())
+        dims[name] = Dimension(name, labels)
+    return dims
+
+
+def selection_mask(dims, codes, filters):
+    """Combine filters into one boolean mask.
+
+    `codes` maps a dimension name to its code array, `filters` maps a dimension name to
+    the selected labels (None means no filter). Returns None when nothing is filtered.
+    """
+    mask = None
+    for name, labels in filters.items():
+        if labels is None:
+            continue
+        selected = dims[name].lookup(labels)[codes[name]]
+        mask = selected if mask is None else mask & selected
+    return mask
+
+
+def filter_rows(dims, df, filters):
+    """Rows of a table with label columns (e.g. the raw world data) that pass the filters."""
+    codes = {name: dims[name].encode(df[name]) for name, labels in filters.items() if labels is not None}
+    mask = selection_mask(dims, codes, filters)
+    return df if mask is None else df[mask]
+
+
+@st.cache_resource(show_spinner=False)
+def _cached_dimensions(version):
+    return build_dimensions(dl.load_world_data())
+
+
+def load_dimensions():
+    """The registry of the world dataset, built once per process (shared, read-only)."""
+    return _cached_dimensions(dl.data_version(dl.WORLD_CSV))
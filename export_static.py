@@ -0,0 +1,333 @@
+"""Export the data story as a static site, for a static host or CDN.
+
+    python export_static.py                      # writes site/ with the default settings
+    python export_static.py --output public --grid
+
+The app is run headless (Streamlit's AppTest) at the default value of every widget. The text,
+images and Plotly figures of that run are written to index.html, with plotly.js and the
+images (as webp) next to it, so the folder needs no Python to be served.
+
+With --grid, the figures of the combinations in GRID are rendered as well and stored as json
+files in figures/. The page then gets a select box per filter and swaps the figure in the
+browser. These files are fetched, so serve the folder over http (python -m http.server).
+"""
+import argparse
+import hashlib
+import html
+import io
+import itertools
+import json
+import re
+import shutil
+import textwrap
+import time
+from pathlib import Path
+from unittest import mock
+
+import plotly.offline
+from PIL import Image
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest
+
+import image_assets
+from story_app import APP, WIDGET_TYPES
+
+
+TIMEOUT = 120
+
+# Filter combinations pre-rendered with --grid: section -> {widget label: values}.
+# The first chart of the section that has these widgets is swapped.
+GRID = {
+    "world": {
+        "Select Sex": ["Both", "male", "female"],
+        "Select Measure": ["Suicides per 100k", "Total Suicides"],
+        "Select Year for map": [1990, 1995, 2000, 2005, 2010, 2015],
+    },
+    "sex": {"Select Year for box plot": [1990, 1995, 2000, 2005, 2010, 2015]},
+    "gdp": {"Select Year for scatter plot": [1990, 1995, 2000, 2005, 2010, 2015]},
+    "who": {
+        "Select Sex for the WHO map": ["Both sexes", "Male", "Female"],
+        "Select Year for the WHO map": [2000, 2005, 2010, 2015, 2019, 2021],
+    },
+}
+
+#------------------------------------------------------------------------------------------------------------------
+# Running the app
+
+def run_app():
+    """Run the app once at its default settings.
+
+    Returns (AppTest, media storage). The storage holds the bytes of every st.image.
+    """
+    storage = MemoryMediaFileStorage("/mock/media")
+    with mock.patch("streamlit.testing.v1.app_test.MemoryMediaFileStorage", lambda endpoint: storage):
+        at = AppTest.from_file(str(APP), default_timeout=TIMEOUT).run()
+    check(at)
+    return at, storage
+
+
+def check(at):
+    if at.exception:
+        raise RuntimeError(f"the app raised: {at.exception[0].message}")
+
+
+def find_widget(at, label):
+    for kind in WIDGET_TYPES:
+        for widget in getattr(at, kind):
+            if widget.label == label:
+                return widget
+    raise KeyError(f"no widget with label {label!r}")
+
+
+def children(node):
+    return list(getattr(node, "children", {}).values())
+
+
+def element_type(node):
+    return getattr(node, "type", None)
+
+
+def descendants(node):
+    for child in children(node):
+        yield child
+        yield from descendants(child)
+
+
+def grid_chart(at, labels):
+    """The first chart of the innermost block that has all widgets in `labels` (the section)."""
+    best = None
+    stack = [(at._tree, 0)]
+    while stack:
+        node, depth = stack.pop()
+        inside = list(descendants(node))
+        found = {child.label for child in inside if element_type(child) in WIDGET_TYPES}
+        charts = [child for child in inside if element_type(child) == "plotly_chart"]
+        if set(labels) <= found and charts:
+            if best is None or depth > best[0]:
+                best = (depth, charts[0])
+            stack.extend((child, depth + 1) for child in children(node))
+    if best is None:
+        raise KeyError(f"no chart next to the widgets {labels}")
+    return best[1]
+
+
+def figure_json(node):
+    """The figure of a st.plotly_chart element, as Plotly.js expects it."""
+    spec = json.loads(node.proto.spec)
+    return {"data": spec.get("data", []), "layout": spec.get("layout", {}), "frames": spec.get("frames", [])}
+
+
+#------------------------------------------------------------------------------------------------------------------
+# Writing the site
+
+def inline_html(text):
+    """Escape a line of Markdown and turn **bold** and *italic* into html."""
+    text = html.escape(text)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+    return re.sub(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])", r"<em>\1</em>", text)
+
+
+def markdown_to_html(text):
+    """The small part of Markdown the story uses: headings, rules, paragraphs, bold, italic and raw html."""
+    text = textwrap.dedent(text).strip()
+    if text.startswith("<"):
+        return text  # st.markdown(..., unsafe_allow_html=True)
+    blocks = []
+    for block in re.split(r"\n\s*\n", text):
+        block = " ".join(line.strip() for line in block.splitlines())
+        heading = re.match(r"^(#{1,6})\s+(.*)$", block)
+        if heading:
+            level = len(heading.group(1))
+            blocks.append(f"<h{level}>{inline_html(heading.group(2))}</h{level}>")
+        elif re.fullmatch(r"[_\-*]{3,}", block):
+            blocks.append("<hr>")
+        elif block:
+            blocks.append(f"<p>{inline_html(block)}</p>")
+    return "\n".join(blocks)
+
+
+def write_image(url, storage, output, pictures):
+    """Write the image behind a media url to images/ as webp, named after its content.
+
+    `pictures` is image_assets.pictures_by_content(): a picture of Pictures/ gets its webp variant,
+    made from the original. Anything else is converted from the bytes st.image got.
+    """
+    served = storage.get_file(url.rsplit("/", 1)[-1]).content
+    name = pictures.get(hashlib.sha256(served).hexdigest())
+    if name is not None:
+        data = image_assets.read_image(name, "webp")
+    else:
+        with Image.open(io.BytesIO(served)) as image:
+            data = image_assets.encode(image, "webp")
+    name = f"{hashlib.sha256(data).hexdigest()[:16]}.webp"
+    (output / "images").mkdir(exist_ok=True)
+    (output / "images" / name).write_bytes(data)
+    return f"images/{name}"
+
+
+def script_json(data):
+    # json inside a <script> tag must not close the tag
+    return json.dumps(data).replace("</", "<\\/")
+
+
+def grid_controls(chart_id, grid):
+    parts = [f'<div class="grid" data-chart="{chart_id}">']
+    for label, values in grid["filters"].items():
+        options = "".join(
+            f'<option{" selected" if value == grid["defaults"][label] else ""}>{html.escape(str(value))}</option>'
+            for value in values)
+        parts.append(f"<label>{html.escape(label)} <select>{options}</select></label>")
+    parts.append("</div>")
+    return "\n".join(parts)
+
+
+class Page:
+    """Turns the element tree of one run into HTML, writing the images on the way."""
+
+    def __init__(self, storage, output, grids):
+        self.storage = storage
+        self.pictures = image_assets.pictures_by_content()
+        self.output = output
+        self.grids = grids  # proto id of a chart -> its grid
+        self.chart_grids = {}  # chart id in the page -> name of its grid
+        self.charts = itertools.count()
+
+    def render(self, node):
+        kind = element_type(node)
+        if kind == "markdown":
+            return markdown_to_html(node.proto.body)
+        if kind == "image":
+            return "\n".join(f'<img src="{write_image(img.url, self.storage, self.output, self.pictures)}" alt="" loading="lazy">'
+                             for img in node.proto.imgs)
+        if kind == "plotly_chart":
+            return self.chart(node)
+        if kind in WIDGET_TYPES or not children(node):
+            return ""  # widgets only exist in the live app
+        inner = "\n".join(filter(None, (self.render(child) for child in children(node))))
+        if not inner:
+            return ""  # e.g. columns that only had widgets
+        if kind == "column":
+            return f'<div class="column" style="flex: {node.weight}">{inner}</div>'
+        if any(element_type(child) == "column" for child in children(node)):
+            return f'<div class="columns">{inner}</div>'
+        return inner
+
+    def chart(self, node):
+        chart_id = f"chart-{next(self.charts)}"
+        parts = []
+        grid = self.grids.get(node.proto.id)
+        if grid:
+            self.chart_grids[chart_id] = grid["name"]
+            parts.append(grid_controls(chart_id, grid))
+        parts.append(f'<div class="chart" id="{chart_id}"></div>')
+        parts.append(f'<script type="application/json" id="{chart_id}-figure">{script_json(figure_json(node))}</script>')
+        return "\n".join(parts)
+
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Suicides in the World</title>
+<style>
+body {{ font-family: 'Montserrat', Roboto, sans-serif; margin: 0; color: #31333f; line-height: 1.6; }}
+aside {{ max-width: 720px; margin: 1rem auto; padding: 0 1rem; }}
+aside img {{ max-width: 160px; }}
+main {{ max-width: 1100px; margin: 0 auto; padding: 1rem; }}
+.columns {{ display: flex; gap: 1rem; }}
+.column:empty {{ display: none; }}
+img {{ max-width: 100%; height: auto; }}
+.grid label {{ margin-right: 1rem; }}
+@media (max-width: 800px) {{ .columns {{ display: block; }} }}
+</style>
+<script src="plotly.min.js"></script>
+</head>
+<body>
+<aside>
+{sidebar}
+</aside>
+<main>
+{main}
+</main>
+<script>
+const grids = {grids};
+document.querySelectorAll(".chart").forEach(div => {{
+  const figure = JSON.parse(document.getElementById(div.id + "-figure").textContent);
+  Plotly.newPlot(div, figure.data, figure.layout, {{responsive: true}})
+    .then(() => figure.frames.length && Plotly.addFrames(div, figure.frames));
+}});
+document.querySelectorAll(".grid").forEach(controls => {{
+  const chart = controls.dataset.chart;
+  controls.querySelectorAll("select").forEach(select => select.addEventListener("change", () => {{
+    const key = [...controls.querySelectorAll("select")].map(s => s.value).join("|");
+    fetch(grids[chart][key]).then(response => response.json())
+      .then(figure => Plotly.react(chart, figure.data, figure.layout));
+  }}));
+}});
+</script>
+</body>
+</html>
+"""
+
+
+def grid_options(at):
+    """GRID with the defaults of the app added, keyed on the proto id of the chart it swaps."""
+    grids = {}
+    for name, filters in GRID.items():
+        defaults = {label: find_widget(at, label).value for label in filters}
+        filters = {label: values if defaults[label] in values else [defaults[label]] + values
+                   for label, values in filters.items()}
+        grids[grid_chart(at, list(filters)).proto.id] = {"name": name, "filters": filters, "defaults": defaults}
+    return grids
+
+
+def export_grid(at, grid, output):
+    """Render every combination of one grid on an app that already ran, returns {key: json file}."""
+    name, filters = grid["name"], grid["filters"]
+    (output / "figures" / name).mkdir(parents=True, exist_ok=True)
+    files = {}
+    for number, values in enumerate(itertools.product(*filters.values())):
+        for label, value in zip(filters, values):
+            find_widget(at, label).set_value(value)
+        at.run()
+        check(at)
+        path = f"figures/{name}/{number}.json"
+        (output / path).write_text(json.dumps(figure_json(grid_chart(at, list(filters)))), encoding="utf-8")
+        files["|".join(str(value) for value in values)] = path
+    # back to the defaults for the next grid
+    for label, value in grid["defaults"].items():
+        find_widget(at, label).set_value(value)
+    print(f"grid {name}: {len(files)} figures")
+    return files
+
+
+def export(output, grid=False):
+    output = Path(output)
+    if output.exists():
+        shutil.rmtree(output)
+    output.mkdir(parents=True)
+
+    start = time.perf_counter()
+    at, storage = run_app()
+    page = Page(storage, output, grid_options(at) if grid else {})
+    main, sidebar = (page.render(block) for block in children(at._tree)[:2])
+
+    # the widgets are changed after the page is rendered, the tree of the default run is not needed anymore
+    files = {grid["name"]: export_grid(at, grid, output) for grid in page.grids.values()}
+    grids = {chart_id: files[name] for chart_id, name in page.chart_grids.items()}
+
+    (output / "index.html").write_text(PAGE.format(main=main, sidebar=sidebar, grids=script_json(grids)),
+                                       encoding="utf-8")
+    (output / "plotly.min.js").write_text(plotly.offline.get_plotlyjs(), encoding="utf-8")
+
+    size = sum(path.stat().st_size for path in output.rglob("*") if path.is_file())
+    print(f"exported to {output} ({size / 2**20:.1f} MB) in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="site", help="folder to write the site to (emptied first)")
+    parser.add_argument("--grid", action="store_true", help="also pre-render the filter combinations in GRID")
+    args = parser.parse_args()
+    export(args.output, args.grid)
@@ -0,0 +1,76 @@
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+import streamlit as st
+
+
+# Number of figures kept in memory, can be changed with an environment variable
+DEFAULT_SIZE = 128
+SIZE_ENV = "DATASTORY_FIGURE_CACHE_SIZE"
+
+
+class FigureCache:
+    """Bounded LRU cache of finished Plotly figures, shared by all sessions.
+
+    The key is the filter state of a chart, e.g. ("world_map", year, sex, measure, ages).
+    A hit skips the aggregation and Plotly Express completely. The figures are shared,
+    so they must not be changed after they are built.
+    """
+
+    def __init__(self, max_entries=DEFAULT_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (figure, size of the serialized figure in bytes)
+        self.lock = threading.Lock()  # every session runs in its own thread
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def fetch(self, key, build):
+        """Return (figure for `key`, True if it came from the cache), calling build() only when it is not cached."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0], True
+            self.misses += 1
+
+        # build outside the lock, so other sessions are not blocked by a slow figure
+        fig = build()
+        size = len(pio.to_json(fig, validate=False))
+
+        with self.lock:
+            self.entries[key] = (fig, size)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return fig, False
+
+    def payload_bytes(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        return entry[1] if entry else None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(size for _, size in self.entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_figure_cache():
+    """The process-wide figure cache."""
+    return FigureCache(int(os.environ.get(SIZE_ENV, DEFAULT_SIZE)))
+
+
+def age_key(ages):
+    """Order independent key for a selection of age groups (None means all)."""
+    return None if ages is None else tuple(sorted(ages))
@@ -0,0 +1,102 @@
+import json
+
+import numpy as np
+import streamlit as st
+
+import data_loader as dl
+
+
+# Default simplification: ~0.005 degrees is about 350 m, invisible at the zoom level of the map
+DEFAULT_TOLERANCE = 0.005
+DEFAULT_PRECISION = 4  # decimals kept of every coordinate (~10 m)
+SIMPLIFIED_GEOJSON = dl.COMPILED_DIR / "provinces_nederland.simplified.json"
+
+
+def simplify_line(points, tolerance):
+    """Douglas-Peucker simplification of a list of [x, y] points."""
+    points = np.asarray(points, dtype="float64")
+    if len(points) < 3:
+        return points
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            # closed ring: distance to the start point
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            middle = start + 1 + index
+            keep[middle] = True
+            stack.append((start, middle))
+            stack.append((middle, end))
+    return points[keep]
+
+
+def simplify_ring(ring, tolerance, precision):
+    """Simplify a closed polygon ring, keeping it a valid ring (at least 4 points)."""
+    simplified = simplify_line(ring, tolerance)
+    if len(simplified) < 4:
+        simplified = np.asarray(ring, dtype="float64")
+    return np.round(simplified, precision).tolist()
+
+
+def simplify_geojson(geojson, tolerance=DEFAULT_TOLERANCE, precision=DEFAULT_PRECISION):
+    """Copy of a (Multi)Polygon feature collection with simplified, rounded geometry.
+
+    Only the `name` property is kept, it is the only one the map uses.
+    """
+    features = []
+    for feature in geojson["features"]:
+        geometry = feature["geometry"]
+        if geometry["type"] == "Polygon":
+            coordinates = [simplify_ring(ring, tolerance, precision) for ring in geometry["coordinates"]]
+        elif geometry["type"] == "MultiPolygon":
+            coordinates = [[simplify_ring(ring, tolerance, precision) for ring in polygon]
+                           for polygon in geometry["coordinates"]]
+        else:
+            raise ValueError(f"unsupported geometry type {geometry['type']}")
+        features.append({
+            "type": "Feature",
+            "properties": {"name": feature["properties"]["name"]},
+            "geometry": {"type": geometry["type"], "coordinates": coordinates},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def encode_geojson(geojson):
+    """Compact json, without the spaces json.dumps adds by default."""
+    return json.dumps(geojson, separators=(",", ":"), ensure_ascii=False)
+
+
+def write_simplified_geojson(tolerance=DEFAULT_TOLERANCE, precision=DEFAULT_PRECISION):
+    """Build step, used by compile_data.py. Returns the path of the written asset."""
+    dl.COMPILED_DIR.mkdir(exist_ok=True)
+    simplified = simplify_geojson(dl.read_geojson(dl.PROVINCES_GEOJSON), tolerance, precision)
+    SIMPLIFIED_GEOJSON.write_text(encode_geojson(simplified), encoding="utf-8")
+    return SIMPLIFIED_GEOJSON
+
+
+@st.cache_resource(show_spinner=False)
+def _cached_simplified_geojson(version):
+    asset = dl.read_compiled_asset("provinces_simplified", dl.PROVINCES_GEOJSON)
+    if asset is not None:
+        return json.loads(asset)
+    # no (fresh) compiled asset, simplify with the default settings
+    return simplify_geojson(dl.load_provinces_geojson())
+
+
+def load_provinces(simplified=True):
+    """GeoJSON of the provinces, simplified (default) or with the full detailed borders."""
+    if not simplified:
+        return dl.load_provinces_geojson()
+    return _cached_simplified_geojson(dl.data_version(dl.PROVINCES_GEOJSON))
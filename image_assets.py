@@ -0,0 +1,139 @@
+"""Resized and recompressed variants of the pictures in Pictures/.
+
+compile_data.py writes the variants to Data/compiled/images/, with the hash of the content
+in the file name. The app gets the bytes from load_image(), which keeps them in memory for
+all sessions, so a picture is read (or made) once per process instead of once per session.
+
+st.image re-encodes every format except JPEG, PNG and GIF, so the app gets a JPEG (or a
+palette PNG when the picture is transparent), which Streamlit passes on unchanged. The WebP
+variant is smaller and is used by the static export (read_image(name, "webp")).
+"""
+import hashlib
+import io
+from pathlib import Path
+
+import streamlit as st
+from PIL import Image
+
+import data_loader as dl
+
+
+PICTURES_DIR = Path(__file__).resolve().parent / "Pictures"
+IMAGES_DIR = dl.COMPILED_DIR / "images"
+
+# Widest a picture is shown at: the centre column on a full HD screen, or the sidebar
+MAIN_WIDTH = 1200
+SIDEBAR_WIDTH = 400
+IMAGE_WIDTHS = {"Portret.jpg": SIDEBAR_WIDTH}  # every other picture: MAIN_WIDTH
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 82
+EXTENSIONS = {"jpeg": "jpg", "png": "png", "webp": "webp"}
+
+
+def has_alpha(image):
+    """True when some pixel of the picture is (partly) transparent."""
+    if "transparency" in image.info:
+        image = image.convert("RGBA")
+    return image.mode in ("RGBA", "LA") and image.getchannel("A").getextrema()[0] < 255
+
+
+def resize(image, width):
+    """Scale down to `width` pixels wide, smaller pictures are left as they are."""
+    if image.width <= width:
+        return image
+    return image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+
+
+def encode(image, image_format):
+    """Bytes of the picture as "jpeg", "png" (256 colours, keeps transparency) or "webp"."""
+    out = io.BytesIO()
+    if image_format == "jpeg":
+        image.convert("RGB").save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    elif image_format == "png":
+        image.convert("RGBA").quantize(256, method=Image.Quantize.FASTOCTREE).save(out, "PNG", optimize=True)
+    elif image_format == "webp":
+        image.save(out, "WEBP", quality=WEBP_QUALITY, method=6)
+    else:
+        raise ValueError(f"unknown image format {image_format!r}")
+    return out.getvalue()
+
+
+def served_format(image):
+    """The format st.image gets: one it does not re-encode."""
+    return "png" if has_alpha(image) else "jpeg"
+
+
+def make_variants(path, webp=True):
+    """{format: bytes} of one picture: the served format and (webp True) webp, at its display width."""
+    with Image.open(path) as original:
+        original_format = (original.format or "").lower()
+        image = resize(original, IMAGE_WIDTHS.get(Path(path).name, MAIN_WIDTH))
+        image.load()
+        formats = [served_format(image)] + (["webp"] if webp else [])
+        variants = {image_format: encode(image, image_format) for image_format in formats}
+
+    # a jpeg that already fits is kept as it is, unless encoding it again saves more than a third
+    original_bytes = Path(path).read_bytes()
+    if image is original and original_format == formats[0] and len(original_bytes) <= len(variants[formats[0]]) * 1.5:
+        variants[formats[0]] = original_bytes
+    return variants
+
+
+def variant_name(path, data, image_format):
+    """e.g. header.3f2a9c1b7d4e.png, a changed picture gets a new name."""
+    return f"{Path(path).stem}.{hashlib.sha256(data).hexdigest()[:12]}.{EXTENSIONS[image_format]}"
+
+
+def write_image_variants():
+    """Build step, used by compile_data.py. Returns {picture name: manifest entry}."""
+    IMAGES_DIR.mkdir(parents=True, exist_ok=True)
+    for old in IMAGES_DIR.iterdir():
+        old.unlink()  # variants of pictures that changed or are gone
+
+    entries = {}
+    for path in sorted(PICTURES_DIR.iterdir()):
+        if not path.is_file():
+            continue
+        variants = make_variants(path)
+        files = {}
+        for image_format, data in variants.items():
+            name = variant_name(path, data, image_format)
+            (IMAGES_DIR / name).write_bytes(data)
+            files[image_format] = f"{IMAGES_DIR.name}/{name}"
+        served = next(iter(variants))
+        entries[path.name] = {"file": files[served], "source": path.name, "format": served, "variants": files,
+                              "bytes": {image_format: len(data) for image_format, data in variants.items()}}
+    return entries
+
+
+def read_image(name, image_format=None):
+    """Bytes of the picture `name` in Pictures/: the served variant, or the one in `image_format`.
+
+    Read from Data/compiled/images/ when it is up to date, else made from the original.
+    """
+    path = PICTURES_DIR / name
+    data = dl.read_compiled_image(name, path, image_format)
+    if data is not None:
+        return data
+    if image_format is None:
+        # no (fresh) compiled variant, make only the one st.image gets now
+        return next(iter(make_variants(path, webp=False).values()))
+    return make_variants(path)[image_format]
+
+
+def pictures_by_content():
+    """{sha256 of the served bytes: picture name}, to find the picture behind an st.image."""
+    return {hashlib.sha256(read_image(path.name)).hexdigest(): path.name
+            for path in sorted(PICTURES_DIR.iterdir()) if path.is_file()}
+
+
+@st.cache_resource(show_spinner=False)
+def _cached_image(path, version):
+    return read_image(Path(path).name)
+
+
+def load_image(name):
+    """Bytes of the picture `name` in Pictures/ to give to st.image (shared, read-only)."""
+    path = PICTURES_DIR / name
+    return _cached_image(str(path), dl.data_version(path))
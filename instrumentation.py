@@ -0,0 +1,113 @@
+"""Opt-in timing of the stages of every section.
+
+Turn it on with the environment variable DATASTORY_PROFILE=1 or by opening the app
+with ?profile=1. Every stage is then timed and written to the "datastory.profile"
+logger as one json line, and the sidebar gets a table with the timings of the
+latest run of every section. When it is off, stage() only costs a function call.
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+
+
+PROFILE_ENV = "DATASTORY_PROFILE"
+LOG_LEVEL_ENV = "DATASTORY_LOG_LEVEL"
+
+# Debug output of the app, off (WARNING) unless DATASTORY_LOG_LEVEL says otherwise
+logger = logging.getLogger("datastory")
+profile_logger = logging.getLogger("datastory.profile")
+
+
+def setup_logging():
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(os.environ.get(LOG_LEVEL_ENV, "WARNING").upper())
+    logger.propagate = False
+    # profile records are only written when profiling is on, so they can always pass
+    profile_logger.setLevel(logging.INFO)
+
+
+setup_logging()
+
+
+def enabled():
+    """True when profiling is turned on by the environment or the query string."""
+    if os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return st.query_params.get("profile") in ("1", "true")
+    except Exception:
+        # no Streamlit session, e.g. in benchmark.py
+        return False
+
+
+def _records():
+    return st.session_state.setdefault("_profile_records", {})
+
+
+def start_section(section):
+    """Forget the timings of the previous run of this section."""
+    if enabled():
+        _records()[section] = []
+
+
+@contextmanager
+def stage(section, name, **info):
+    """Time a named stage of a section.
+
+    Yields a dict, put extra facts in it (cache_hit, rows, payload_bytes, ...).
+    """
+    if not enabled():
+        yield info
+        return
+
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        record = {"section": section, "stage": name, "ms": round((time.perf_counter() - start) * 1000, 2), **info}
+        _records().setdefault(section, []).append(record)
+        profile_logger.info(json.dumps(record, default=str))
+
+
+def show_sidebar(figures=None):
+    """Collapsible table with the latest timings of every section, and the counters of the figure cache."""
+    if not enabled():
+        return
+    records = [record for section in _records().values() for record in section]
+    with st.sidebar.expander("Timings of the last run", expanded=False):
+        if figures is not None:
+            stats = figures.stats()
+            profile_logger.info(json.dumps({"figure_cache": stats}))
+            st.caption("Figure cache (all sessions of this process):")
+            st.dataframe([stats], hide_index=True)
+        if not records:
+            st.write("No timings yet.")
+            return
+        st.caption(f"Total: {sum(record['ms'] for record in records):.1f} ms. "
+                   "Sections rerun on their own are shown after the next full rerun.")
+        st.dataframe(records, hide_index=True)
+
+
+#------------------------------------------------------------------------------------------------------------------
+# Helpers for the stages every chart has
+
+def cached_figure(section, figures, key, build):
+    """figures.fetch(), timed as the "figure" stage with the cache hit and payload size."""
+    with stage(section, "figure") as info:
+        fig, info["cache_hit"] = figures.fetch(key, build)
+        info["payload_bytes"] = figures.payload_bytes(key)
+    return fig
+
+
+def plotly_chart(section, fig, **kwargs):
+    """st.plotly_chart(), timed as the "render" stage (Streamlit serializes the figure here)."""
+    with stage(section, "render"):
+        st.plotly_chart(fig, **kwargs)
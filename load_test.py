@@ -0,0 +1,381 @@
+"""Load test: N readers using one running app at the same time, like they would in a browser.
+
+    python load_test.py                              # 8 sessions, 10 interactions each
+    python load_test.py --sessions 32 --interactions 20 --output before.json
+    python load_test.py --compare before.json        # show the change against an earlier run
+    python load_test.py --url ws://host:8501         # an app that is already running
+
+The app is started with `streamlit run` on a free port (one worker) and every session is a
+websocket connection to it, speaking the protocol of the browser. A session opens the page and
+then moves a slider, changes a multiselect, etc. (the widgets in INTERACTIONS, picked at random
+with --seed, so two runs with the same seed do the same), each followed by the rerun the browser
+would ask for: only the fragment of the widget.
+
+Reported: p50/p95/p99 of the time from sending a change until the run is finished (first load and
+reruns apart), runs per second over all sessions, and how much the worker (RSS) grew per session,
+with the sessions still connected. The caches are warmed with one session before the clock starts,
+--cold skips that. Exceptions shown by the app are counted; a session that cannot go on (timeout,
+lost connection, missing widget) stops the whole test, so the numbers always cover every run.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from contextlib import contextmanager
+
+import numpy as np
+import streamlit
+import websockets
+from packaging.version import Version
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+from story_app import APP, WIDGET_TYPES
+
+
+# The widget values below are sent the way this version of the frontend sends them. The app itself
+# runs on older versions, so this is in requirements-dev.txt and not in requirements.txt.
+STREAMLIT_MIN = "1.65"
+TIMEOUT = 300  # seconds for one run, with many sessions at once they queue for the worker
+STARTUP_TIMEOUT = 60
+
+# What a reader does, picked at random: widget label -> weight. Sliders and multiselects most.
+INTERACTIONS = {
+    "Select Year for map": 4,
+    "Select Age Groups": 3,
+    "Select Sex": 1,
+    "Select Measure": 1,
+    "Animate over years": 1,
+    "First period": 2,
+    "Select Age Groups for the comparison": 2,
+    "Show as": 1,
+    "Select Year for box plot": 3,
+    "Select Age Groups for box plot": 2,
+    "Select Year for scatter plot": 3,
+    "Show detailed province borders": 1,
+    "Select Year for the WHO map": 3,
+    "Select Sex for the WHO map": 1,
+    "Select Country": 2,
+}
+
+PERCENTILES = (50, 95, 99)
+FINISHED = ForwardMsg.ScriptFinishedStatus
+
+
+class HarnessError(Exception):
+    """The test itself could not go on; the app did not (necessarily) do anything wrong."""
+
+
+#------------------------------------------------------------------------------------------------------------------
+# The app
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def launch_app():
+    """Start the app with `streamlit run`, yields (websocket url, process)."""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(APP), "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=1) as response:
+                    if response.status == 200:
+                        break
+            except OSError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise HarnessError("streamlit run did not start")
+            time.sleep(0.2)
+        yield f"ws://localhost:{port}", process
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def rss_mb(pid):
+    """Current resident memory of a process, None where /proc is not available."""
+    try:
+        with open(f"/proc/{pid}/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return None
+
+
+#------------------------------------------------------------------------------------------------------------------
+# Sessions
+
+def widget_default(kind, proto):
+    if kind == "slider":
+        values = [int(v) for v in proto.default]
+        return values[0] if len(values) == 1 else tuple(values)
+    if kind in ("radio", "selectbox"):
+        return proto.options[proto.default]
+    if kind == "multiselect":
+        return [proto.options[i] for i in proto.default]
+    return proto.default  # checkbox
+
+
+def random_value(widget, rng):
+    """Another value for the widget, from its own options or range."""
+    kind, proto, value = widget["kind"], widget["proto"], widget["value"]
+    if kind == "checkbox":
+        return not value
+    if kind == "slider":
+        low, high = int(proto.min), int(proto.max)
+        if isinstance(value, tuple):
+            return tuple(sorted(rng.sample(range(low, high + 1), 2)))
+        return rng.randint(low, high)
+    if kind == "multiselect":
+        return rng.sample(list(proto.options[1:]), rng.randint(1, 3)) if rng.random() < 0.8 else ["All"]
+    return rng.choice(list(proto.options))  # radio, selectbox
+
+
+def set_state(state, kind, value):
+    if kind == "slider":
+        state.double_array_value.data.extend(value if isinstance(value, tuple) else [value])
+    elif kind == "multiselect":
+        state.string_array_value.data.extend(value)
+    elif kind == "checkbox":
+        state.bool_value = value
+    else:
+        state.string_value = value
+
+
+class Session:
+    """One reader: a websocket connection with the widget values it has set."""
+
+    def __init__(self, url):
+        self.url = url
+        self.widgets = {}  # label -> {"kind", "proto", "fragment", "value"}
+        self.changed = {}  # label -> value, sent with every rerun like the browser does
+        self.ws = None
+
+    async def __aenter__(self):
+        try:
+            self.ws = await websockets.connect(f"{self.url}/_stcore/stream", subprotocols=["streamlit"],
+                                               max_size=None, open_timeout=TIMEOUT)
+        except (OSError, websockets.WebSocketException) as error:
+            raise HarnessError(f"cannot connect to {self.url}: {error}") from error
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.ws.close()
+
+    async def run(self, fragment=""):
+        """Ask for a (fragment) rerun and wait until it is finished. Returns (seconds, app exceptions)."""
+        msg = BackMsg()
+        msg.rerun_script.fragment_id = fragment
+        for label, value in self.changed.items():
+            widget = self.widgets[label]
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = widget["proto"].id
+            set_state(state, widget["kind"], value)
+
+        start = time.perf_counter()
+        exceptions = 0
+        try:
+            await self.ws.send(msg.SerializeToString())
+            async with asyncio.timeout(TIMEOUT):
+                while True:
+                    forward = ForwardMsg()
+                    forward.ParseFromString(await self.ws.recv())
+                    kind = forward.WhichOneof("type")
+                    if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                        exceptions += self.read_element(forward.delta)
+                    elif kind == "script_finished":
+                        break
+        except TimeoutError as error:
+            raise HarnessError(f"no end of the run after {TIMEOUT} s") from error
+        except websockets.WebSocketException as error:
+            raise HarnessError(f"connection lost: {error}") from error
+        seconds = time.perf_counter() - start
+        if forward.script_finished == FINISHED.FINISHED_WITH_COMPILE_ERROR:
+            exceptions += 1
+        return seconds, exceptions
+
+    def read_element(self, delta):
+        """Remember the widgets of the page, returns 1 for an exception element."""
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            return 1
+        if kind in WIDGET_TYPES:
+            proto = getattr(element, kind)
+            known = self.widgets.get(proto.label)
+            value = known["value"] if known else widget_default(kind, proto)
+            self.widgets[proto.label] = {"kind": kind, "proto": proto, "fragment": delta.fragment_id, "value": value}
+        return 0
+
+    async def change(self, label, rng):
+        widget = self.widgets.get(label)
+        if widget is None:
+            raise HarnessError(f"no widget with label {label!r} on the page")
+        widget["value"] = self.changed[label] = random_value(widget, rng)
+        return await self.run(widget["fragment"])
+
+
+async def reader(url, number, interactions, seed, think, ramp, runs, opened, done):
+    """One reader: open the app, do `interactions` random widget changes, stay until `done`."""
+    rng = random.Random(seed * 1000 + number)
+    labels, weights = list(INTERACTIONS), list(INTERACTIONS.values())
+    await asyncio.sleep(number * ramp)
+    async with Session(url) as session:
+        runs.append(("load", *await session.run()))
+        for _ in range(interactions):
+            if think:
+                await asyncio.sleep(rng.uniform(0, think))
+            runs.append(("rerun", *await session.change(rng.choices(labels, weights)[0], rng)))
+        opened.append(number)
+        await done.wait()  # connected until the memory is measured, like a reader with the tab open
+
+
+#------------------------------------------------------------------------------------------------------------------
+# Measuring
+
+def latency(times):
+    if not times:
+        return None
+    stats = {f"p{p}_ms": round(float(np.percentile(times, p)) * 1000, 1) for p in PERCENTILES}
+    stats["mean_ms"] = round(statistics.mean(times) * 1000, 1)
+    stats["max_ms"] = round(max(times) * 1000, 1)
+    stats["count"] = len(times)
+    return stats
+
+
+async def load_test(url, pid, sessions, interactions, seed, think, ramp, cold):
+    warmup = None
+    if not cold:
+        async with Session(url) as session:
+            warmup, _ = await session.run()
+
+    memory_before = rss_mb(pid) if pid else None
+    runs, opened, done = [], [], asyncio.Event()
+    readers = [asyncio.create_task(reader(url, number, interactions, seed, think, ramp, runs, opened, done))
+               for number in range(sessions)]
+    start = time.perf_counter()
+    try:
+        while len(opened) < sessions:
+            finished = [task for task in readers if task.done()]
+            for task in finished:
+                task.result()  # raises the HarnessError of a session that stopped
+            await asyncio.sleep(0.05)
+        wall = time.perf_counter() - start
+        memory_after = rss_mb(pid) if pid else None
+    finally:
+        done.set()
+        for task in readers:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+
+    loads = [seconds for kind, seconds, _ in runs if kind == "load"]
+    reruns = [seconds for kind, seconds, _ in runs if kind == "rerun"]
+    memory = memory_before is not None and memory_after is not None
+    return {
+        "sessions": sessions,
+        "interactions": interactions,
+        "warmup_s": round(warmup, 3) if warmup is not None else None,
+        "wall_s": round(wall, 3),
+        "runs_per_s": round(len(runs) / wall, 2),
+        "first_load": latency(loads),
+        "rerun": latency(reruns),
+        "memory_before_mb": round(memory_before, 1) if memory else None,
+        "memory_after_mb": round(memory_after, 1) if memory else None,
+        "memory_per_session_mb": round((memory_after - memory_before) / sessions, 2) if memory else None,
+        "app_exceptions": sum(exceptions for _, _, exceptions in runs),
+    }
+
+
+def run(sessions, interactions, seed=0, think=0.0, ramp=0.0, cold=False, url=None):
+    if Version(streamlit.__version__) < Version(STREAMLIT_MIN):
+        raise HarnessError(f"load_test.py needs streamlit >= {STREAMLIT_MIN}, this is {streamlit.__version__}")
+    if url:
+        return asyncio.run(load_test(url, None, sessions, interactions, seed, think, ramp, cold))
+    with launch_app() as (url, process):
+        return asyncio.run(load_test(url, process.pid, sessions, interactions, seed, think, ramp, cold))
+
+
+def show(results):
+    print(f"{results['sessions']} sessions x {results['interactions']} interactions in {results['wall_s']:.1f} s, "
+          f"{results['runs_per_s']:.2f} runs/s")
+    for name in ("first_load", "rerun"):
+        stats = results[name]
+        if stats:
+            print(f"{name:<12} " + "   ".join(f"p{p} {stats[f'p{p}_ms']:8.1f} ms" for p in PERCENTILES)
+                  + f"   ({stats['count']} runs)")
+    if results["memory_per_session_mb"] is not None:
+        print(f"memory       {results['memory_before_mb']:.0f} -> {results['memory_after_mb']:.0f} MB, "
+              f"{results['memory_per_session_mb']:.2f} MB per session")
+    if results["app_exceptions"]:
+        print(f"the app showed {results['app_exceptions']} exceptions")
+
+
+def compare(results, path):
+    with open(path, "r", encoding="utf-8") as f:
+        before = json.load(f)["results"]
+    print(f"\ncompared to {path}:")
+    rows = [(f"rerun p{p}", f"p{p}_ms", "rerun") for p in PERCENTILES]
+    rows += [(f"first load p{p}", f"p{p}_ms", "first_load") for p in PERCENTILES]
+    for name, key, group in rows:
+        if before.get(group) and results.get(group):
+            old, new = before[group][key], results[group][key]
+            print(f"{name:<18} {old:9.1f} -> {new:9.1f} ms  ({new / old - 1:+.0%})")
+    old, new = before["runs_per_s"], results["runs_per_s"]
+    print(f"{'runs/s':<18} {old:9.2f} -> {new:9.2f}     ({new / old - 1:+.0%})")
+    old, new = before["memory_per_session_mb"], results["memory_per_session_mb"]
+    if old is not None and new is not None:
+        print(f"{'MB per session':<18} {old:9.2f} -> {new:9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8, help="number of readers at the same time")
+    parser.add_argument("--interactions", type=int, default=10, help="widget changes per reader")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random interactions")
+    parser.add_argument("--think", type=float, default=0.0, help="pause of up to this many seconds before a change")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds between the start of two sessions")
+    parser.add_argument("--cold", action="store_true", help="start with empty caches instead of warming them")
+    parser.add_argument("--url", help="websocket url of an app that is already running (no memory numbers then)")
+    parser.add_argument("--output", default="load_test_results.json", help="json file with the results")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    args = parser.parse_args()
+
+    try:
+        results = run(args.sessions, args.interactions, args.seed, args.think, args.ramp, args.cold, args.url)
+    except HarnessError as error:
+        sys.exit(f"load test failed, no results written: {error}")
+    show(results)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "streamlit": streamlit.__version__,
+        "url": args.url,
+        "seed": args.seed,
+        "think_s": args.think,
+        "ramp_s": args.ramp,
+        "cold": args.cold,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
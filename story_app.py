@@ -0,0 +1,11 @@
+"""The app script and its widgets, for the tools that run it (export_static.py, load_test.py).
+
+Kept free of Streamlit and the data modules, so a tool can import it without loading them.
+"""
+from pathlib import Path
+
+
+APP = Path(__file__).resolve().parent / "Datastory_suicides_WouterNobel.py"
+
+# Kinds of widget the story uses, named like the element types of Streamlit
+WIDGET_TYPES = ["radio", "slider", "selectbox", "multiselect", "checkbox"]
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import aggregates as ag
+import data_loader as dl
+import dimensions
+
+
+@pytest.fixture(scope="module")
+def world():
+    df = dl.read_world_data(dl.WORLD_CSV)
+    dims = dimensions.build_dimensions(df)
+    return df, dims, ag.YearPartition(ag.build_cube(df, dims))
+
+
+def groupby_rates(df, first, last):
+    rows = df[(df["year"] >= first) & (df["year"] <= last)]
+    sums = rows.groupby("country", observed=True)[["suicides_no", "population"]].sum()
+    sums = sums[sums["population"] > 0]
+    return sums["suicides_no"] / sums["population"] * 100000
+
+
+@pytest.mark.parametrize("windows", [
+    ((1996, 2005), (2006, 2015)),
+    ((1996, 2010), (2000, 2015)),  # overlapping
+    ((2000, 2010), (2000, 2010)),  # the same period twice
+])
+def test_window_change_matches_groupby(world, windows):
+    df, dims, cube = world
+    change = ag.window_change(dims, ag.window_sums(cube, dims, windows)).set_index("country")
+
+    before, after = (groupby_rates(df, *window) for window in windows)
+    expected = sorted(set(before.index) & set(after.index))
+    assert sorted(change.index) == expected
+    np.testing.assert_allclose(change.loc[expected, "rate_before"], before[expected])
+    np.testing.assert_allclose(change.loc[expected, "rate_after"], after[expected])
@@ -0,0 +1,134 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cbs_ingest as cbs
+import data_loader as dl
+
+
+@pytest.fixture(scope="module")
+def sheets():
+    """The raw sex and region sheets of the workbook in Data/."""
+    with pd.ExcelFile(dl.CBS_XLSX) as workbook:
+        return {title: workbook.parse(cbs.find_sheet(workbook, title), header=None)
+                for title in (cbs.SEX_TITLE, cbs.REGION_TITLE)}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """An empty store in a temporary folder."""
+    monkeypatch.setattr(cbs, "STORE_DIR", tmp_path)
+    for name in ("SEX_TABLE", "REGION_TABLE", "PERIOD_TABLE", "INGESTED"):
+        monkeypatch.setattr(cbs, name, tmp_path / getattr(cbs, name).name)
+    monkeypatch.setattr(cbs, "_checked", {})
+    return tmp_path
+
+
+@pytest.fixture
+def warnings(caplog, monkeypatch):
+    monkeypatch.setattr(cbs.logger, "propagate", True)
+    caplog.set_level(logging.WARNING, logger=cbs.logger.name)
+    return caplog
+
+
+def shifted(raw, rows=3):
+    """The sheet with empty rows between the title and the header, like a release with an extra note."""
+    blank = pd.DataFrame(np.nan, index=range(rows), columns=raw.columns)
+    return pd.concat([raw.iloc[:1], blank, raw.iloc[1:]], ignore_index=True)
+
+
+#------------------------------------------------------------------------------------------------------------------
+# Parsing
+
+def test_parse_sheets_with_shifted_header_rows(sheets):
+    sex = sheets[cbs.SEX_TITLE]
+    pd.testing.assert_frame_equal(cbs.parse_sex_sheet(shifted(sex)), cbs.parse_sex_sheet(sex))
+
+    region = sheets[cbs.REGION_TITLE]
+    for got, expected in zip(cbs.parse_region_sheet(shifted(region)), cbs.parse_region_sheet(region)):
+        pd.testing.assert_frame_equal(got, expected)
+
+
+def test_read_workbook_with_moved_sheets(sheets, tmp_path):
+    path = tmp_path / "release.xlsx"
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        pd.DataFrame([["Inhoud"]]).to_excel(writer, sheet_name="Inhoud", header=False, index=False)
+        for number, title in enumerate([cbs.REGION_TITLE, cbs.SEX_TITLE]):
+            shifted(sheets[title], rows=2).to_excel(writer, sheet_name=f"Tabel {number + 1}", header=False, index=False)
+
+    for got, expected in zip(cbs.read_workbook(path), cbs.read_workbook(dl.CBS_XLSX)):
+        pd.testing.assert_frame_equal(got, expected)
+
+
+def test_missing_column_raises(sheets):
+    sex = sheets[cbs.SEX_TITLE].copy()
+    sex[sex.columns[-1]] = np.nan  # the total of the standardized rate
+    with pytest.raises(cbs.CbsLayoutError, match="misses the columns"):
+        cbs.parse_sex_sheet(sex)
+
+
+def test_missing_province_raises(sheets):
+    region = sheets[cbs.REGION_TITLE]
+    region = region[region[0] != "Zeeland"].reset_index(drop=True)
+    with pytest.raises(cbs.CbsLayoutError, match="Zeeland"):
+        cbs.parse_region_sheet(region)
+
+
+#------------------------------------------------------------------------------------------------------------------
+# Merging
+
+def sex_rows(years, men=10):
+    return pd.DataFrame({"Year": years, "Men_Absolute": [men] * len(years)})
+
+
+def test_merge_appends_a_new_year():
+    merged, added, revised = cbs.merge_rows(sex_rows([2020, 2021]), sex_rows([2020, 2021, 2022]), ["Year"], "sex")
+    assert (added, revised) == (1, 0)
+    assert merged["Year"].tolist() == [2020, 2021, 2022]
+
+
+def test_merge_skips_a_reingest(warnings):
+    merged, added, revised = cbs.merge_rows(sex_rows([2020, 2021]), sex_rows([2020, 2021]), ["Year"], "sex")
+    assert (added, revised) == (0, 0)
+    pd.testing.assert_frame_equal(merged, sex_rows([2020, 2021]))
+    assert not warnings.records
+
+
+def test_merge_reports_a_revised_year(warnings):
+    stored, new = sex_rows([2020, 2021]), sex_rows([2020, 2021], men=12)
+    merged, added, revised = cbs.merge_rows(stored, new, ["Year"], "sex")
+    assert (added, revised) == (0, 0)
+    pd.testing.assert_frame_equal(merged, stored)
+    assert "2 stored rows have other numbers" in warnings.text
+
+
+def test_merge_replaces_a_revised_year_with_update_existing():
+    stored = sex_rows([2020, 2021])
+    new = pd.DataFrame({"Year": [2021, 2022], "Men_Absolute": [12, 13]})
+    merged, added, revised = cbs.merge_rows(stored, new, ["Year"], "sex", update_existing=True)
+    assert (added, revised) == (1, 1)
+    assert merged.set_index("Year")["Men_Absolute"].to_dict() == {2020: 10, 2021: 12, 2022: 13}
+
+
+#------------------------------------------------------------------------------------------------------------------
+# The store
+
+def test_ingest_twice(store):
+    added = cbs.ingest(dl.CBS_XLSX)
+    assert all(added.values())
+    assert cbs.ingest(dl.CBS_XLSX) == {name: 0 for name in added}
+    assert not list(store.glob("*.tmp"))
+    for got, expected in zip(cbs.read_store(), cbs.read_workbook_tables(dl.CBS_XLSX)):
+        pd.testing.assert_frame_equal(got, expected)
+
+
+def test_read_only_store_falls_back_to_the_workbook(store, monkeypatch):
+    def read_only(*args, **kwargs):
+        raise PermissionError("read-only file system")
+    monkeypatch.setattr(cbs, "replace_file", read_only)
+
+    assert cbs.ensure_ingested(dl.CBS_XLSX) is False
+    assert cbs.cbs_version(dl.CBS_XLSX)[0] == "workbook"
+    assert not cbs.SEX_TABLE.exists()
@@ -0,0 +1,9 @@
+from export_static import markdown_to_html
+
+
+def test_markdown_to_html():
+    assert markdown_to_html("### A **bold** head") == "<h3>A <strong>bold</strong> head</h3>"
+    assert markdown_to_html("---") == "<hr>"
+    assert (markdown_to_html("In **64 of the 90** countries it was *lower*, 2 * 3 < 7.")
+            == "<p>In <strong>64 of the 90</strong> countries it was <em>lower</em>, 2 * 3 &lt; 7.</p>")
+    assert markdown_to_html("<div>raw</div>") == "<div>raw</div>"